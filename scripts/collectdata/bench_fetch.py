@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Benchmark and check of fetch.py against a local stand-in server
+
+Run with python bench_fetch.py [--urls=N] [--delay=S] [--jobs=N]
+to serve N documents, each answered after S seconds, from a threaded local
+HTTP server and to download them into empty caches, one at a time then with
+N jobs, printing the requests per second and connections opened, then to
+revalidate them. It also checks what is stored for a 404, a redirection to a
+404 and a server stalling past the timeout of the fetcher.
+
+Dependencies :
+requests"""
+
+import sys, time, shutil, tempfile, threading
+from hashlib import md5
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+
+from fetch import Fetcher
+
+STALL_TIMEOUT = 1
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Documents under /doc/, 404 under /missing/, redirections to a 404
+    under /redirect/ and no answer before the stall seconds under /stall."""
+    protocol_version = "HTTP/1.1"
+    # Headers and body in one write, not delayed by the acknowledgement of the headers
+    wbufsize = -1
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        with self.server.lock:
+            self.server.stats["connections"] += 1
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.stats["requests"] += 1
+        time.sleep(self.server.delay)
+        headers = {}
+        if self.path.startswith("/doc/"):
+            code, body = 200, ("<p>%s</p>\n" % self.path) * 50
+            headers["ETag"] = '"%s"' % md5(body).hexdigest()
+            if self.headers.get("If-None-Match") == headers["ETag"]:
+                code, body = 304, ""
+                with self.server.lock:
+                    self.server.stats["not_modified"] += 1
+        elif self.path.startswith("/redirect/"):
+            code, body = 302, ""
+            headers["Location"] = self.path.replace("/redirect/", "/missing/")
+        elif self.path == "/stall":
+            time.sleep(self.server.stall)
+            code, body = 200, "too late"
+        else:
+            code, body = 404, "not found"
+        self.send_response(code)
+        for header, value in headers.items():
+            self.send_header(header, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StandInServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    # Connections of all the jobs at once, not delayed by a retried SYN
+    request_queue_size = 64
+
+    def __init__(self, delay, stall):
+        HTTPServer.__init__(self, ("127.0.0.1", 0), StandInHandler)
+        self.delay = delay
+        self.stall = stall
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.stats = {"requests": 0, "connections": 0, "not_modified": 0}
+
+    def url(self, path):
+        return "http://127.0.0.1:%d%s" % (self.server_address[1], path)
+
+
+def run(server, cachedir, urls, jobs, revalidate=False):
+    server.reset()
+    fetcher = Fetcher(cachedir, jobs, revalidate)
+    start = time.time()
+    fetcher.prefetch(urls)
+    fetcher.close()
+    elapsed = time.time() - start
+    print "  jobs=%d%s: %d requests in %.2fs, %.1f req/s, %d connections, %d not modified" % (
+        jobs, " revalidate" if revalidate else "", fetcher.requests, elapsed,
+        fetcher.requests / elapsed if elapsed else 0, server.stats["connections"], server.stats["not_modified"])
+    return fetcher
+
+
+if __name__ == "__main__":
+    nurls = 200
+    delay = 0.02
+    jobs = 8
+    for opt in sys.argv[1:]:
+        try:
+            if opt.startswith('--urls='):
+                nurls = int(opt.split('=', 1)[1])
+            elif opt.startswith('--delay='):
+                delay = float(opt.split('=', 1)[1])
+            elif opt.startswith('--jobs='):
+                jobs = int(opt.split('=', 1)[1])
+        except ValueError:
+            sys.stderr.write("ERROR: usage: python bench_fetch.py [--urls=N] [--delay=S] [--jobs=N]\n")
+            exit(1)
+
+    server = StandInServer(delay, STALL_TIMEOUT * 5)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    urls = [server.url("/doc/%d" % i) for i in range(nurls)]
+    tmpdirs = []
+    try:
+        print "[BENCH] %d documents answered after %.3fs:" % (nurls, delay)
+        for j in sorted(set([1, jobs])):
+            tmpdirs.append(tempfile.mkdtemp())
+            fetcher = run(server, tmpdirs[-1], urls, j)
+        assert(fetcher.cache.stats["misses"] == nurls)
+        fetcher = run(server, tmpdirs[-1], urls, jobs, revalidate=True)
+        assert(fetcher.cache.stats["revalidated"] == nurls)
+
+        print "[TEST] Stored documents, 404 and redirections to a 404:"
+        missing = [server.url("/missing/1"), server.url("/redirect/2")]
+        fetcher = Fetcher(tmpdirs[-1], jobs, timeout=STALL_TIMEOUT)
+        fetcher.prefetch(missing)
+        for url in missing:
+            assert(fetcher.cache.lookup(url) == ({"status": 404}, "\n"))
+        for i, url in enumerate(urls):
+            assert(fetcher.cache.lookup(url)[1] == ("<p>/doc/%d</p>\n" % i) * 50)
+        print " -> Success!"
+
+        print "[TEST] A stalled server fails after the timeout instead of hanging:"
+        start = time.time()
+        fetcher.prefetch([server.url("/stall"), server.url("/doc/stalled-neighbour")])
+        elapsed = time.time() - start
+        fetcher.close()
+        assert(elapsed < STALL_TIMEOUT * 3)
+        assert(fetcher.cache.lookup(server.url("/stall")) == ({"status": 0}, ""))
+        assert(fetcher.cache.lookup(server.url("/doc/stalled-neighbour"))[0]["status"] == 200)
+        print " -> Success! (%.2fs with a timeout of %ds)" % (elapsed, STALL_TIMEOUT)
+    finally:
+        server.shutdown()
+        for tmpdir in tmpdirs:
+            shutil.rmtree(tmpdir)
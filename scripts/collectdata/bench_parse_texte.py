@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Benchmark of the parse_texte.py backends on recorded texts
+
+Run with python bench_parse_texte.py [--repeat=N] LAW_FILE ...
+where the LAW_FILEs are html texts as downloaded by generate_data.py (in
+data/.tmp/html), to parse each of them N times with every backend available,
+printing the best time and the peak RSS of the parsing process and checking
+that the backends give the same records.
+
+Dependencies :
+html5lib, beautifulsoup4, simplejson, lxml (optional)"""
+
+import os, sys, time, tempfile
+from subprocess import Popen
+from parse_texte import backends, etree
+
+script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "parse_texte.py")
+
+
+def run(backend, path):
+    """Return the time, peak RSS in MB, exit code and output of one parse."""
+    with tempfile.TemporaryFile() as out, open(os.devnull, "w") as devnull:
+        start = time.time()
+        p = Popen([sys.executable, script, "--backend=%s" % backend, path], stdout=out, stderr=devnull)
+        _, status, usage = os.wait4(p.pid, 0)
+        elapsed = time.time() - start
+        out.seek(0)
+        return elapsed, usage.ru_maxrss / 1024., status >> 8, out.read()
+
+
+if __name__ == "__main__":
+    repeat = 3
+    paths = []
+    for opt in sys.argv[1:]:
+        if opt.startswith('--repeat='):
+            try:
+                repeat = int(opt.split('=', 1)[1])
+            except ValueError:
+                paths = []
+                break
+        else:
+            paths.append(opt)
+    if not paths:
+        sys.stderr.write("ERROR: usage: python bench_parse_texte.py [--repeat=N] LAW_FILE ...\n")
+        exit(1)
+
+    names = [b for b in sorted(backends) if b != "lxml" or etree is not None]
+    for path in paths:
+        print "[BENCH] %s (%d KB):" % (os.path.basename(path), os.path.getsize(path) / 1024)
+        outputs = {}
+        for backend in names:
+            runs = [run(backend, path) for _ in range(repeat)]
+            elapsed = min(r[0] for r in runs)
+            rss = max(r[1] for r in runs)
+            code, outputs[backend] = runs[0][2], runs[0][3]
+            print "  %-8s %6.2fs %7.1f MB peak RSS, %d records%s" % (
+                backend, elapsed, rss, outputs[backend].count("\n"), ", exit code %d" % code if code else "")
+        same = len(set(outputs.values())) == 1
+        print "  backends %s" % ("give the same records" if same else "DIFFER")
@@ -0,0 +1,168 @@
+#!/usr/bin/python
+# -*- coding=utf-8 -*-
+"""Run with python check_clean_html.py [LAW_FILE ...]
+to check parse_texte.clean_html and real_lower against the chain of byte
+regexps and replaces they replaced, on paragraphs written as in the html of
+the AN, Sénat and Légifrance texts and on every paragraph of the LAW_FILEs
+given, as downloaded by generate_data.py.
+
+The former chain worked on the utf-8 bytes, so its character classes such as
+[«\"\s] matched the single bytes of multi-byte characters: "<br/>»" lost the
+first byte of the » (shared with «) and left an invalid utf-8 byte. The only
+expected differences are lines where the former output is not valid utf-8.
+
+Dependencies :
+html5lib, beautifulsoup4, simplejson"""
+
+import re, sys
+from parse_texte import clean_html, real_lower, section_titles, html5lib_paragraphs, read_texte
+
+# Former clean_html, see parse_texte.py before its single decode engine
+upcase_accents = "ÇÀÂÄÉÈÊËÎÏÔÖÙÛÜ"
+locase_accents = "çàâäéèêëîïôöùûü"
+
+
+def former_real_lower(text):
+    for a in upcase_accents:
+        text = text.replace(a, locase_accents[upcase_accents.find(a)])
+    return text.lower()
+
+
+def former_lower_but_first(text):
+    return text[0].upper() + former_real_lower(text[1:])
+
+re_clean_spaces = re.compile(r'\s+')
+lower_inner_title = lambda x: x.group(1)+former_lower_but_first(x.group(3))+" "
+html_replace = [
+    (re.compile(r"−"), "-"),
+    (re.compile(r" "), " "),
+    (re.compile(r"<!--.*?-->", re.I), ""),
+    (re.compile(r"</?br/?>[«\"\s]+", re.I), " "),
+    (re.compile(r'(«\s+|\s+»)'), '"'),
+    (re.compile(r'(«|»|“|”|„|‟|❝|❞|＂|〟|〞|〝)'), '"'),
+    (re.compile(r"(’|＇|’|ߴ|՚|ʼ|❛|❜)"), "'"),
+    (re.compile(r"(‒|–|—|―|⁓|‑|‐|⁃|⏤)"), "-"),
+    (re.compile(r"(</?\w+)[^>]*>"), r"\1>"),
+    (re.compile(r"(</?)em>", re.I), r"\1i>"),
+    (re.compile(r"(</?)strong>", re.I), r"\1b>"),
+    (re.compile(r"<(![^>]*|/?(p|span))>", re.I), ""),
+    (re.compile(r"\s*\n+\s*"), " "),
+    (re.compile(r"<[^>]*></[^>]*>"), ""),
+    (re.compile(r"^<b><i>", re.I), "<i><b>"),
+    (re.compile(r"</b>(\s*)<b>", re.I), r"\1"),
+    (re.compile(r"</?sup>", re.I), ""),
+    (re.compile(r"^((<[bi]>)*)\((S|AN)[12]\)\s*", re.I), r"\1"),
+    (re.compile(r"^(<b>Article\s*)\d+\s*<s>\s*", re.I), r"\1"),
+    (re.compile(r"<s>(.*)</s>", re.I), ""),
+    (re.compile(r"</?s>", re.I), ""),
+    (re.compile(r"\s*</?img>\s*", re.I), ""),
+    (re.compile(r"œ([A-Z])"), r"OE\1"),
+    (re.compile(r"œ\s*", re.I), "oe"),
+    (re.compile(r'^((<[^>]*>)*")%s ' % section_titles, re.I), lower_inner_title),
+    (re.compile(r' pr..?liminaire', re.I), ' préliminaire'),
+    (re.compile(r'<strike>[^<]*</strike>', re.I), ''),
+    (re_clean_spaces, " "),
+]
+
+
+def former_clean_html(t):
+    for regex, repl in html_replace:
+        t = regex.sub(repl, t)
+    return t.strip()
+
+
+def valid_utf8(t):
+    try:
+        t.decode('utf-8')
+        return True
+    except UnicodeDecodeError:
+        return False
+
+# Paragraphs as html5lib hands them over from the texts of the assemblies
+lines = [
+    '<p align="center"><b>PROJET DE LOI</b></p>',
+    '<p>Le Sénat a adopté le projet de loi dont la teneur suit :</p>',
+    '<p align="center"><b>relatif à la consommation,</b></p>',
+    '<p class="assnatLoiTitre" align="center" style="text-align:center"><b><span style="font-size:12.0pt">TITRE I<sup>ER</sup></span></b></p>',
+    '<p align="center"><b>TITRE PRÉLIMINAIRE</b></p>',
+    '<p align="center"><b>CHAPITRE I<sup>er</sup></b></p>',
+    '<p align="center"><b>Action de groupe</b></p>',
+    '<p align="center"><b>Article 1<sup>er</sup></b></p>',
+    '<p align="center"><b>Article 2 <i>bis</i> A (nouveau)</b></p>',
+    '<p align="center"><b>Article 4 </b><b>ter</b></p>',
+    '<p align="center"><b><i>Article 5 quater</i></b></p>',
+    '<p align="center"><i>(Supprimé)</i></p>',
+    '<p align="center"><i>(Non modifié)</i></p>',
+    '<p align="center"><i>(Conforme)</i></p>',
+    '<p align="center">.......................................................................................................................</p>',
+    '<p>Le chapitre III du titre II du livre IV du code de la consommation est ainsi modifié :</p>',
+    '<p>1° Au premier alinéa de l’article L. 423-1, les mots : « peut agir » sont remplacés par les mots : « peuvent agir » ;</p>',
+    '<p>2° Après l’article L. 423-1, il est inséré un article L. 423-1-1 ainsi rédigé :</p>',
+    '<p>« <i>Art. L. 423-1-1.</i> – Une association de défense des consommateurs représentative au niveau national et agréée en application de l’article L. 411-1 peut agir devant une juridiction civile afin d’obtenir la réparation des préjudices individuels subis par des consommateurs placés dans une situation similaire ou identique et ayant pour cause commune un manquement d’un ou des mêmes professionnels à leurs obligations légales ou contractuelles : »</p>',
+    '<p>« 1° À l’occasion de la vente de biens ou de la fourniture de services ;</p>',
+    '<p>« 2° Ou lorsque ces préjudices résultent de pratiques anticoncurrentielles au sens du titre II du livre IV du code de commerce ou des articles 101 et 102 du traité sur le fonctionnement de l’Union européenne. »</p>',
+    '<p>« Le juge fixe le délai dont disposent les consommateurs pour adhérer au groupe afin d’obtenir la réparation de leur préjudice. Ce délai ne peut être inférieur à deux mois ni supérieur à six mois après l’achèvement des mesures de publicité ordonnées par lui. »</p>',
+    '<p>II. – <i>(Non modifié)</i> Le code monétaire et financier est ainsi modifié :</p>',
+    '<p>III (nouveau). – L’article L. 121-1 est complété par un alinéa ainsi rédigé :</p>',
+    '<p>« Art. L. 121-1-1. - Sont réputées trompeuses, au sens de l\'article L. 121-1, les pratiques commerciales qui ont pour objet :</p>',
+    '<p>« 3° <i>bis</i> (nouveau) Le fait de proposer l’achat d’un produit à un prix déterminé, puis :</p>',
+    '<p>a) De refuser d\'enregistrer les commandes ;</p>',
+    '<p>b) (Supprimé)</p>',
+    '<p>« a) (nouveau) Le montant de la sanction est fixé à 15&nbsp;000&nbsp;€ pour une personne physique et à 75&nbsp;000&nbsp;€ pour une personne morale ; »</p>',
+    '<p>Les dispositions du présent article entrent en vigueur le 1<sup>er</sup> janvier 2015.</p>',
+    '<p><i>Délibéré en séance publique, à Paris, le 13 septembre 2013.</i></p>',
+    '<p align="center"><i>Le Président,</i><br/><i>Signé :</i> Claude BARTOLONE</p>',
+    '<p><b>(AN1) Article 3</b></p>',
+    '<p><strong>Article 7</strong> <s>Le présent article est supprimé.</s></p>',
+    '<p><b>Article 8 <s>bis</s></b></p>',
+    '<p>Les mots : « et du cœur de la ville » sont remplacés par les mots : « du Cœur de Ville » ;</p>',
+    '<p>Les crédits de l\'œuvre sociale, l’Œuvre, le Œ<b>UVRE</b> sont maintenus.</p>',
+    '<p>“La commission mixte paritaire ‒ saisie ‒ a adopté le texte ci-après — sans modification.”</p>',
+    '<p><span style="font-family:Times">« </span>L\'État peut, par voie de convention, déléguer…<span> »</span></p>',
+    '<p><!-- saut de page -->« Titre II</p>',
+    '<p align="center">« TITRE II</p>',
+    '<p align="center">« CHAPITRE PRÉLIMINAIRE</p>',
+    '<p align="center">« Section 1</p>',
+    '<p align="center">« SOUS-SECTION 2</p>',
+    '<p align="center">«&nbsp;LIVRE III</p>',
+    '<p>« Dispositions relatives au chapitre prèliminaire</p>',
+    '<p>À la fin du <em>b</em> du 1°, la référence : « L. 111-1 » est remplacée par la référence : « L. 112-1 ».</p>',
+    '<p><img src="/14/ta/ta0180.gif" alt=""/> Tableau annexé</p>',
+    '<p><strike>Le 3° est abrogé.</strike> Le 4° est ainsi rédigé :</p>',
+    '<p>Le montant de la taxe est fixé\nà 2&#160;% du chiffre d’affaires\n\n hors taxes.</p>',
+    '<p>«&nbsp;Art. L.&nbsp;313-3.&nbsp;−&nbsp;Le prêteur informe l’emprunteur.&nbsp;»</p>',
+    '<p>Le présent projet de loi comporte 5 titres.<br/>« Le titre I<sup>er</sup> »</p>',
+    '<p>(S1) Au deuxième alinéa, le mot : « consommateur » est remplacé par le mot : « client ».</p>',
+    '<p class="assnatLoiTexte">1° A (nouveau) L\'article L. 111-1 est ainsi rédigé :<br/>»</p>',
+]
+
+if __name__ == "__main__":
+
+    # Test real_lower on every byte and the accented capitals
+    print "[TEST] real_lower maps the same bytes as its former replaces:"
+    for t in [chr(i) for i in range(256)] + [upcase_accents, locase_accents, "ÉTAT ÇA ÀÜ Œ ÉÈÊË", "TITRE PRÉLIMINAIRE"]:
+        assert(real_lower(t) == former_real_lower(t))
+    print " -> Success!"
+
+    print "[TEST] Former <br/>» output is invalid utf-8, the » is now kept as a quote:"
+    assert(former_clean_html('<p>texte<br/>»</p>') == 'texte \xbb')
+    assert(clean_html('<p>texte<br/>»</p>') == 'texte<br>"')
+    print " -> Success!"
+
+    print "[TEST] clean_html gives the former results on %d paragraphs:" % len(lines)
+    for line in lines:
+        new, old = clean_html(line), former_clean_html(line)
+        assert(new == old or not valid_utf8(old)), (line, new, old)
+        assert(real_lower(new) == former_real_lower(new))
+    print " -> Success!"
+
+    for path in sys.argv[1:]:
+        same = differ = 0
+        for line in html5lib_paragraphs(read_texte(path))[1]:
+            new, old = clean_html(line), former_clean_html(line)
+            if new == old:
+                same += 1
+            else:
+                assert(not valid_utf8(old)), (path, line, new, old)
+                differ += 1
+        print "[TEST] %s: %d paragraphs identical, %d only differing where the former output was invalid utf-8" % (path, same, differ)
@@ -0,0 +1,64 @@
+#!/usr/bin/python
+# -*- coding=utf-8 -*-
+"""Run with python check_complete_articles.py
+to check the errors of complete_articles.py on a texte définitif leaving
+articles of the previous step, whose pending titles must be printed in the
+order of the previous step, as the former list of titles did.
+
+Dependencies :
+simplejson"""
+
+import os, sys, shutil, tempfile, subprocess
+import simplejson as json
+
+script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "complete_articles.py")
+
+previous = [u"1er", u"2", u"3", u"4 bis", u"3", u"10", u"11", u"12 ter", u"13 A"]
+
+
+def article(titre, statut, order):
+    return {"type": "article", "titre": titre, "statut": statut, "order": order, "section": "T1",
+            "alineas": {"001": u"Texte de l'article %s" % titre}}
+
+
+def write_step(path, texte, articles):
+    with open(path, "w") as f:
+        f.write(json.dumps(texte) + "\n")
+        for line in articles:
+            f.write(json.dumps(line) + "\n")
+
+
+def former_left(removed):
+    # The former list of titles, from which each title used was removed
+    left = list(previous)
+    for titre in removed:
+        left.remove(titre)
+    return left
+
+
+if __name__ == "__main__":
+
+    root = tempfile.mkdtemp()
+    try:
+        prevpath = os.path.join(root, "previous.json")
+        path = os.path.join(root, "%2Fta0002.json")
+        write_step(prevpath, {"type": "texte", "id": "02_S12-154", "depot": False, "definitif": False, "titre": "x", "expose": ""},
+                   [article(t, "initial", i + 1) for i, t in enumerate(previous)])
+
+        # Titles of the texte définitif, article left first, titles used before it
+        for titles, cur, removed in [
+                ([u"1er"], u"2", [u"1er", u"2"]),
+                ([u"1er", u"2", u"3"], u"4 bis", [u"1er", u"2", u"3", u"4 bis"]),
+                ([u"1er", u"2", u"3", u"4 bis", u"3", u"10"], u"11", [u"1er", u"2", u"3", u"4 bis", u"3", u"10", u"11"])]:
+            print "[TEST] Articles left after %s printed in previous step order:" % ", ".join(titles)
+            write_step(path, {"type": "texte", "id": "03_A14-ta0002", "depot": False, "definitif": True, "titre": "x", "expose": ""},
+                       [article(t, "", i + 1) for i, t in enumerate(titles)])
+            p = subprocess.Popen([sys.executable, script, path, prevpath], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            out, err = p.communicate()
+            assert(p.returncode == 1)
+            left = former_left(removed)
+            expected = "ERROR: %s articles left:\n%s %s\n" % (len(left) + 1, cur, [str(t) for t in left])
+            assert(err.endswith(expected)), (err, expected)
+            print " -> Success!"
+    finally:
+        shutil.rmtree(root)
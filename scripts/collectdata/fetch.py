@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Cached HTTP fetching of the dossiers resources
+
+Run with python fetch.py [--jobs=N] [--revalidate] [--timeout=S] CACHEDIR URL [URL...]
+to download the given urls concurrently into the webcache.py store CACHEDIR.
+
+Connections are kept alive and pooled per host through one requests session
+shared by a bounded pool of worker threads. A resource answering 404 (possibly
+after redirections) is stored as an empty line, any other failure as an empty
+file, as the former curl based download did. A server not answering within
+timeout seconds, to connect or between two reads, counts as a failure so that
+it cannot hang a worker and the whole run with it.
+
+See bench_fetch.py for a benchmark against a local stand-in server.
+
+Cached resources are used as is, unless revalidate is set: each of them is
+then checked once per run with a conditional GET on its ETag/Last-Modified.
+
+Dependencies :
+requests"""
+
+import sys, time
+from threading import Lock
+from multiprocessing.pool import ThreadPool
+import requests
+from requests.adapters import HTTPAdapter
+
+from webcache import WebCache, escapeit
+
+TIMEOUT = 60
+
+
+class Fetcher(object):
+
+    def __init__(self, cachedir, jobs=8, revalidate=False, max_size=1024*1024*1024, timeout=TIMEOUT):
+        self.cache = WebCache(cachedir, max_size)
+        self.jobs = jobs
+        self.revalidate = revalidate
+        self.timeout = timeout
+        self.checked = set()
+        self.pool = None
+        self.requests = 0
+        self.lock = Lock()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=jobs)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get(self, url, meta=None):
+        """Fetch url in a single request, following redirections.
+
+        With the metadata of a cached copy, the request is conditional and
+        None is returned when that copy is still valid."""
+        with self.lock:
+            self.requests += 1
+        headers = {}
+        if meta and meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta and meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        try:
+            r = self.session.get(url, headers=headers, timeout=self.timeout)
+        except requests.RequestException:
+            return {"status": 0}, ""
+        if r.status_code == 304 and headers:
+            return meta, None
+        if 404 in [h.status_code for h in r.history + [r]]:
+            return {"status": 404}, "\n"
+        return {"status": r.status_code, "etag": r.headers.get("ETag"), "last_modified": r.headers.get("Last-Modified")}, r.content
+
+    def fresh(self, url):
+        return self.cache.has(url) and (not self.revalidate or url in self.checked)
+
+    def download(self, url):
+        if self.fresh(url):
+            entry = self.cache.lookup(url)
+            if entry is not None:
+                self.cache.count("hits")
+                return entry[1]
+        with self.cache.lock(url):
+            # Another job may have fetched it while we waited for the lock
+            entry = self.cache.lookup(url)
+            if entry is not None and (not self.revalidate or url in self.checked):
+                self.cache.count("hits")
+                return entry[1]
+            if entry is None:
+                self.cache.count("misses")
+                meta, body = self.get(url)
+                self.cache.store(url, meta, body)
+            else:
+                meta, body = self.get(url, entry[0])
+                if body is None:
+                    self.cache.count("revalidated")
+                    self.cache.touch(url)
+                    body = entry[1]
+                elif meta["status"] == 0:
+                    # Keep the cached copy when the site cannot be reached
+                    body = entry[1]
+                else:
+                    self.cache.count("refreshed")
+                    self.cache.store(url, meta, body)
+            with self.lock:
+                self.checked.add(url)
+            return body
+
+    def prefetch(self, urls):
+        """Download concurrently those of urls missing from the cache."""
+        todo = []
+        for url in urls:
+            if url not in todo and not self.fresh(url):
+                todo.append(url)
+        if len(todo) > 1 and self.jobs > 1:
+            if self.pool is None:
+                self.pool = ThreadPool(self.jobs)
+            self.pool.map(self.download, todo)
+        else:
+            for url in todo:
+                self.download(url)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+        self.session.close()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    jobs = 8
+    revalidate = False
+    timeout = TIMEOUT
+    while args and args[0].startswith('--'):
+        opt = args.pop(0)
+        if opt.startswith('--jobs='):
+            jobs = int(opt.split('=', 1)[1])
+        elif opt == '--revalidate':
+            revalidate = True
+        elif opt.startswith('--timeout='):
+            timeout = float(opt.split('=', 1)[1])
+    if len(args) < 2:
+        sys.stderr.write("ERROR: usage: python fetch.py [--jobs=N] [--revalidate] [--timeout=S] CACHEDIR URL [URL...]\n")
+        exit(1)
+    fetcher = Fetcher(args[0], jobs, revalidate, timeout=timeout)
+    start = time.time()
+    fetcher.prefetch(args[1:])
+    fetcher.close()
+    elapsed = time.time() - start
+    sys.stderr.write("INFO: %d requests in %.2fs (%.1f/s)\n" % (fetcher.requests, elapsed, fetcher.requests / elapsed if elapsed else 0))
+    sys.stderr.write("INFO: web cache: %(hits)d hits, %(misses)d misses, %(revalidated)d revalidated, %(refreshed)d refreshed, %(evicted)d evicted\n" % fetcher.cache.stats)
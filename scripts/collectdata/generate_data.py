@@ -0,0 +1,384 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Generate the data of all steps of a dossier
+
+Run with python generate_data.py DOSSIER_DESC.CSV [DATADIR] [WITHOUTCACHE]
+DOSSIER_DESC.CSV: CSV describing one or several parliamentary dossiers generated by parse_dossier.pl (from NosSénateurs)
+DATADIR: directory where the data will be written (data/ by default)
+
+Each step's text is parsed, completed and written in one process. The last,
+ante-last and nouvelle lecture steps are kept in memory instead of being
+copied around as .tmp/json/articles_*.json files (the ante-last one is still
+written to disk for sort_amendements.pl). procedure.json is built once all
+steps are written rather than after each of them. Resources are downloaded
+through fetch.py, concurrently when several are known at once. WITHOUTCACHE
+revalidates the cached ones with conditional requests.
+
+Dependencies :
+requests, plus those of parse_texte.py"""
+
+import os, sys, re, shutil, traceback
+from StringIO import StringIO
+from subprocess import Popen, PIPE
+
+from fetch import Fetcher, escapeit
+from memo import MemoStore
+from parse_texte import TexteParser, RecordWriter
+from complete_articles import complete_articles, CompletionError
+from json2arbo import json2arbo, ArboError
+from procedure2json import ProcedureBuilder
+import simplejson as json
+
+
+def download(url):
+    return fetcher.download(url)
+
+def seance_ids(seances):
+    return [i.replace(';', '').strip(" \t") for i in seances.splitlines() if re.search(r'[0-9]', i)]
+
+def is_seance(seancecsv):
+    seancelines = seancecsv.splitlines()
+    return seancelines and re.search(r'[a-z]', seancelines[0])
+
+def write_file(path, content):
+    with open(path, "w") as f:
+        f.write(content)
+
+def read_file(path):
+    try:
+        with open(path, "r") as f:
+            return f.read()
+    except IOError:
+        return None
+
+def count_lines(content):
+    return content.count("\n") if content else 0
+
+def field(line, n):
+    fields = line.split(';')
+    return fields[n-1] if len(fields) >= n else ""
+
+def sed_lines(reg, repl, content):
+    return "".join(reg.sub(repl, l, 1) for l in content.splitlines(True))
+
+re_iso = re.compile(r'iso-\?8859-\?1', re.I)
+re_definitif = re.compile(r'Texte d(&eacute;|\xc3[\xa9\x89]|.)finitif', re.I)
+re_cmp_hemi = re.compile(r';CMP;[a-z]*;hemicycle;')
+re_echec = re.compile(r'"echec"[:,}]')
+re_renvoi_head = re.compile(r'^\{("expose": ").*"(, "id": ")([0-9]+)(_[^"]*", )')
+re_depot_head = re.compile(r'("echec": true, )?("expose": ")[^"]*(", "id": ")([1-9]+)(_[^"]*", )')
+re_depot = re.compile(r'("type": "texte")}$')
+
+def fix_cmp_order(csvpath):
+    """Fix occasional wrong order of votes post CMP"""
+    with open(csvpath, "r") as f:
+        lines = f.read().splitlines(True)
+    raw_a = "".join(l for l in lines if ";CMP;assemblee;hemicycle;" in l).rstrip("\n")
+    raw_s = "".join(l for l in lines if ";CMP;senat;hemicycle;" in l).rstrip("\n")
+    if not raw_a or not raw_s:
+        return
+    line_a = " ".join(raw_a.split())
+    line_s = " ".join(raw_s.split())
+    num_a = re.sub(r'^0', '', field(line_a, 7))
+    num_s = re.sub(r'^0', '', field(line_s, 7))
+    min_num = min(int(num_a), int(num_s))
+    url = field(line_a, 12)
+    if not url:
+        return
+    reorder = False
+    html = sed_lines(re_iso, 'UTF-8', download(url))
+    write_file(os.path.join(data, ".tmp", "html", escapeit(url)), html)
+    if re_definitif.search(html) and min_num != int(num_s):
+        reorder = True
+    else:
+        url = field(line_s, 12)
+        html = sed_lines(re_iso, 'UTF-8', download(url))
+        write_file(os.path.join(data, ".tmp", "html", escapeit(url)), html)
+        if re_definitif.search(html) and min_num != int(num_a):
+            reorder = True
+    if reorder:
+        print "INFO: Reordering CMP hemicycle steps to handle renumbered texte définitif last"
+        lines = [l for l in lines if not re_cmp_hemi.search(l)]
+        lines.append(sed_lines(re.compile(r'(;0*)%s(;[0-9]+;CMP)' % num_a), r'\g<1>%s\g<2>' % num_s, raw_a + "\n"))
+        lines.append(sed_lines(re.compile(r'(;0*)%s(;[0-9]+;CMP)' % num_s), r'\g<1>%s\g<2>' % num_a, raw_s + "\n"))
+        write_file(csvpath, "".join(sorted(lines)))
+
+class Warnings(StringIO):
+    """Captured stderr, unicode warnings such as u"1\xb0" written as utf-8."""
+    def write(self, s):
+        StringIO.write(self, s.encode('utf-8') if isinstance(s, unicode) else s)
+
+def memoized(script, parts, func):
+    """Replay the output and warnings of func if already run on the same inputs."""
+    key = memo.content_key(script, *parts)
+    res = memo.get(key)
+    if res is not None:
+        sys.stderr.write(res[1])
+        return res[0]
+    stderr, sys.stderr = sys.stderr, Warnings()
+    try:
+        out = func()
+    finally:
+        err = sys.stderr.getvalue()
+        sys.stderr = stderr
+        sys.stderr.write(err)
+    memo.put(key, out, err)
+    return out
+
+def parse(htmlpath, order, out):
+    parser.parse(htmlpath, order, RecordWriter(out))
+    return out.getvalue()
+
+def complete(jsonpath, content, previous, anteprevious):
+    out = complete_articles(jsonpath, content.split("\n"), previous.split("\n") if previous is not None else None, anteprevious.split("\n") if anteprevious is not None else None)
+    return "".join(l + "\n" for l in out)
+
+def add_procedure_line(text, mode):
+    if mode == "w":
+        procedure.clear()
+    elif not procedure.lines:
+        # Appending to a procedure.csv left by a previous run
+        for l in (read_file(procedurecsv) or "").splitlines():
+            procedure.add_line(l)
+    with open(procedurecsv, mode) as f:
+        f.write(text)
+    procedure.add_line(text)
+
+def write_procedure():
+    try:
+        content = json.dumps(procedure.build(), sort_keys=True, ensure_ascii=False).encode("utf-8") + "\n"
+    except Exception:
+        traceback.print_exc()
+        content = ""
+    write_file(os.path.join(data, dossier, "procedure.json"), content)
+
+def sort_amendements(content, outputtype):
+    p = Popen(["perl", "sort_amendements.pl", antelastpath, outputtype], stdin=PIPE, stdout=PIPE)
+    return p.communicate(content)[0]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print "USAGE: %s DOSSIER_DESC.CSV [DATADIR] [WITHOUTCACHE]" % sys.argv[0]
+        print "\t DOSSIER_DESC.CSV: CSV décrivant un ou plusieurs dossiers parlementaires générés via parse_dosser.pl (de NosSénateurs)"
+        print "\t DATADIR: répertoire où vont être mises les données (par defaut data/)"
+        sys.exit(1)
+    csvpath = sys.argv[1]
+    data = sys.argv[2] if len(sys.argv) > 2 and sys.argv[2] else "data"
+    revalidate = len(sys.argv) > 3 and bool(sys.argv[3])
+
+    cachedir = os.path.join(data, "..", ".cache", "web")
+    for d in [cachedir, os.path.join(data, ".tmp", "html"), os.path.join(data, ".tmp", "json")]:
+        if not os.path.isdir(d):
+            os.makedirs(d)
+    # Resources are fetched over pooled connections, several at a time when
+    # a list of them is known beforehand
+    fetcher = Fetcher(cachedir, revalidate=revalidate)
+    # Parsing and completion results are memoized on their inputs and code version
+    memo = MemoStore(os.path.join(data, "..", ".cache", "memo"))
+    parser = TexteParser()
+
+    sites = ["2007-2012.nosdeputes", "www.nosdeputes", "www.nossenateurs"]
+    fetcher.prefetch(["http://%s.fr/organismes/groupe/json" % url for url in sites] + ["http://%s.fr/%s/json?" % (url, re.sub(r'^.*nos', '', url)) for url in sites])
+    for url in sites:
+        write_file(os.path.join(data, "..", "%s-groupes.json" % url), download("http://%s.fr/organismes/groupe/json" % url))
+        typeparl = re.sub(r'^.*nos', '', url)
+        write_file(os.path.join(data, "..", "%s.parlementaires.json" % url), download("http://%s.fr/%s/json?" % (url, typeparl)))
+
+    fix_cmp_order(csvpath)
+
+    # Steps states kept from one line to the next, the ante-last one is kept on
+    # disk for sort_amendements.pl along with the nouvelle lecture one as before
+    antelastpath = os.path.join(data, ".tmp", "json", "articles_antelaststep.json")
+    nouvlectpath = os.path.join(data, ".tmp", "json", "articles_nouvlect.json")
+    laststep = None
+    antelaststep = read_file(antelastpath)
+    nouvlect = read_file(nouvlectpath)
+
+    dossier = "procedure"
+    olddossier = ""
+    amdidtext = oldamdidtext = amdidtextcmpa = amdidtextcmps = ""
+    echec = ""
+    procedurecsv = os.path.join(data, dossier, "procedure.csv")
+    # procedure.json is built from the csv lines once all steps are written
+    procedure = ProcedureBuilder(os.path.join(data, dossier))
+    with open(csvpath, "r") as f:
+        csvlines = f.read().splitlines()
+    try:
+        for rawline in csvlines:
+            rawline = rawline.strip(" \t")
+            line = " ".join(rawline.split())
+            etape = "_".join(field(line.replace(' ', ''), n) for n in (7, 9, 10, 11))
+            etapid = re.sub(r'^([0-9]+)_.*$', r'\1', etape)
+            projectdir = os.path.join(data, dossier, etape)
+            norder = field(line, 8)
+            order = field(line, 7)
+            url = field(line, 12)
+            escape = escapeit(url)
+            chambre = field(line, 10)
+            stage = field(line, 11)
+            htmlpath = os.path.join(data, ".tmp", "html", escape)
+            jsonpath = os.path.join(data, ".tmp", "json", escape)
+
+            if not os.path.isdir(os.path.join(data, dossier)):
+                os.makedirs(os.path.join(data, dossier))
+            shutil.rmtree(projectdir, ignore_errors=True)
+            procedure.forget(etape)
+            if re.search(r';(EXTRA|texte retire);', line):
+                add_procedure_line("%s;\n" % rawline, "a")
+                olddossier = dossier
+                continue
+            current = None
+            if ';renvoi en commission;' in line:
+                if not antelaststep:
+                    print "ERROR retrieving texte renvoyé en commission %s empty" % antelastpath
+                    sys.exit(1)
+                head, _, tail = antelaststep.partition("\n")
+                current = re_renvoi_head.sub(r'{"echec": true, \g<1>Le texte est renvoyé en commission."\g<2>%s\g<4>' % etapid, head, 1) + "\n" + tail
+            elif not url:
+                print "MISSING URL %s" % rawline
+            else:
+                depot = "true" if stage == "depot" else "false"
+                #Text export
+                write_file(htmlpath, sed_lines(re_iso, 'UTF-8', download(url)))
+                # Keep the records parsed before a failure, as the former parse_texte.py | sed pipeline did
+                out = StringIO()
+                try:
+                    current = memoized("parse_texte.py", [htmlpath, read_file(htmlpath), order], lambda: parse(htmlpath, order, out))
+                except IOError as e:
+                    sys.stderr.write("ERROR: %s" % e)
+                    current = out.getvalue()
+                except Exception:
+                    traceback.print_exc()
+                    current = out.getvalue()
+                current = sed_lines(re_depot, r'\1, "depot": %s}' % depot, current)
+
+            if url: # START AVOIDED PART WHEN MISSING TEXT
+
+                # Complete missing intermediate depots from last step
+                if count_lines(current) < 2 and stage == "depot" and order != "00":
+                    print "WARNING: creating depot step %s from last step since no data found" % projectdir
+                    head, _, tail = (laststep or "").partition("\n")
+                    current = re_depot_head.sub(r'\g<2>\g<3>%s\g<5>' % etapid, head, 1) + ("\n" + tail if laststep else "")
+                # Complete articles with missing "conforme" or "non-modifié" text for all steps except depots 1ère lecture
+                if norder not in ("1", "4") and laststep:
+                    anteprevious = None
+                    if "hemicycle" in etape and antelaststep:
+                        anteprevious = antelaststep
+                    previous = laststep
+                    if re.search(r'_nouv.lect._senat_hemicycle', etape) and re_echec.search(current):
+                        previous = nouvlect
+                    elif re.search(r'l.définitive', etape):
+                        previous = nouvlect
+                        anteprevious = previous
+                    elif re_echec.search(laststep):
+                        previous = antelaststep
+                    try:
+                        current = memoized("complete_articles.py", [jsonpath, current, previous, anteprevious], lambda: complete(jsonpath, current, previous, anteprevious))
+                    except Exception as e:
+                        if not isinstance(e, CompletionError):
+                            traceback.print_exc()
+                        print "ERROR completing %s" % htmlpath
+                        sys.exit(1)
+
+                echec = ""
+                if re_echec.search(current):
+                    echec = "rejet"
+                    if ';renvoi en commission;' in line:
+                        echec = "renvoi en commission"
+                    elif ';CMP;CMP;commission;' in line:
+                        echec = "échec"
+                try:
+                    json2arbo(jsonpath, current.split("\n"), os.path.join(projectdir, "texte"))
+                except Exception as e:
+                    if not isinstance(e, ArboError):
+                        traceback.print_exc()
+                    shutil.rmtree(projectdir, ignore_errors=True)
+                    print "%s;%s" % (rawline, echec)
+                    print "ERROR creating arbo from %s" % jsonpath
+                    sys.exit(1)
+            else:
+                laststep = None
+            # END AVOIDED PART WHEN MISSING TEXT
+
+            if laststep:
+                antelaststep = laststep
+                write_file(antelastpath, antelaststep)
+            if current is not None and escape:
+                if norder != "1" or order == "00":
+                    laststep = current
+                if re.search(r'_nouv.lect._assemblee_hemicycle', etape):
+                    nouvlect = current
+                    write_file(nouvlectpath, nouvlect)
+
+            add_procedure_line("%s;%s\n" % (rawline, echec), "a" if dossier == olddossier else "w")
+
+            if ';CMP;assemblee;' in line:
+                amdidtext = amdidtextcmpa
+            elif ';CMP;senat;' in line:
+                amdidtext = amdidtextcmps
+            if amdidtext and stage in ("commission", "hemicycle") and olddossier == dossier:
+                if chambre == "senat":
+                    urlchambre = "http://www.nossenateurs.fr"
+                else:
+                    urlchambre = "http://www.nosdeputes.fr/%s" % field(line, 4)
+
+                #Amendements export
+                if not echec:
+                    amddir = os.path.join(projectdir, "amendements")
+                    if not os.path.isdir(amddir):
+                        os.makedirs(amddir)
+                    amdcsv = sort_amendements(download("%s/amendements/%s/csv?" % (urlchambre, amdidtext)), "csv")
+                    write_file(os.path.join(amddir, "amendements.csv"), amdcsv)
+                    if re.search(r'[a-z]', amdcsv):
+                        fetcher.prefetch(["%s/amendements/%s/%s?" % (urlchambre, amdidtext, fmt) for fmt in ("json", "xml")])
+                        for fmt in ("json", "xml"):
+                            write_file(os.path.join(amddir, "amendements.%s" % fmt), sort_amendements(download("%s/amendements/%s/%s?" % (urlchambre, amdidtext, fmt)), fmt))
+                    else:
+                        os.remove(os.path.join(amddir, "amendements.csv"))
+                        os.rmdir(amddir)
+
+                #Interventions export
+                inter_dir = os.path.join(projectdir, "interventions")
+                commission_or_hemicycle = '?commission=1' if 'commission' in etape else '?hemicycle=1'
+                if not oldamdidtext:
+                    oldamdidtext = amdidtext
+                fetcher.prefetch(["%s/seances/%s/csv%s&" % (urlchambre, loiid, commission_or_hemicycle) for loiid in (amdidtext, oldamdidtext)])
+                for loiid in (amdidtext, oldamdidtext):
+                    seances = download("%s/seances/%s/csv%s&" % (urlchambre, loiid, commission_or_hemicycle))
+                    ids = seance_ids(seances)
+                    csvurls = ["%s/seance/%s/%s/csv?" % (urlchambre, i, loiid) for i in ids]
+                    fetcher.prefetch(csvurls)
+                    valid = [i for i, u in zip(ids, csvurls) if is_seance(download(u))]
+                    fetcher.prefetch(["%s/seance/%s/%s/%s?" % (urlchambre, i, loiid, fmt) for i in valid for fmt in ("json", "xml")])
+                    for id_seance in ids:
+                        seancecsv = download("%s/seance/%s/%s/csv?" % (urlchambre, id_seance, loiid))
+                        if is_seance(seancecsv):
+                            l2 = seancecsv.splitlines()[:2][-1]
+                            seance_name = (field(l2, 4) + "T" + field(l2, 5) + "_" + field(l2, 1)).replace(' ', '')
+                            if not os.path.isdir(inter_dir):
+                                os.makedirs(inter_dir)
+                            write_file(os.path.join(inter_dir, "%s.csv" % seance_name), seancecsv)
+                            for fmt in ("json", "xml"):
+                                write_file(os.path.join(inter_dir, "%s.%s" % (seance_name, fmt)), download("%s/seance/%s/%s/%s?" % (urlchambre, id_seance, loiid, fmt)))
+                oldamdidtext = amdidtext
+
+            #End
+            if not echec:
+                amdidtext = field(line, 13)
+                if ';CMP;CMP;commission;' in line:
+                    if 'senat.fr' in line:
+                        amdidtextcmpa = ""
+                        amdidtextcmps = amdidtext
+                    elif 'nationale.fr' in line:
+                        amdidtextcmpa = amdidtext
+                        amdidtextcmps = ""
+
+            olddossier = dossier
+            print "INFO: data exported in %s" % projectdir
+    finally:
+        fetcher.close()
+        print "INFO: web cache: %(hits)d hits, %(misses)d misses, %(revalidated)d revalidated, %(refreshed)d refreshed, %(evicted)d evicted" % fetcher.cache.stats
+        if procedure.lines:
+            write_procedure()
+
@@ -2,10 +2,15 @@
 # -*- coding=utf-8 -*-
 """Create file arborescence corresponding to a law json output from parse_texte.py
 
-Run with python json2arbo.py JSON_FILE PROJECT
+Run with python json2arbo.py [--packed] JSON_FILE PROJECT
 where LAW_FILE results from perl download_loi.pl URL > LAW_FILE
 Outputs results to stdout
 
+With --packed, all files are stored in a single PROJECT.pack file instead,
+see textpack.py to read it or expand it back into the PROJECT directory
+
+From python, json2arbo(JSON_FILE, lines, PROJECT, packed) writes the same files
+
 Dependencies :
 simplejson"""
 
@@ -14,8 +19,14 @@ try:
     import json
 except:
     import simplejson as json
+from textpack import PackWriter
+
+# PackWriter receiving the files instead of the filesystem in packed mode
+pack = None
 
 def mkdirs(d):
+    if pack is not None:
+        return
     if not os.path.exists(d):
         os.makedirs(d)
 
@@ -52,12 +63,9 @@ def clean_text(t):
 #  return t
     return t.strip()
 
-try:
-    FILE = sys.argv[1]
-    f = open(FILE, "r")
-except:
-    sys.stderr.write("ERROR: Cannot open json file %s\n" % FILE)
-    sys.exit(1)
+FILE = ""
+class ArboError(Exception):
+    pass
 
 def log_err(txt, arg=None):
     txt = "ERROR: %s" % txt
@@ -67,6 +75,9 @@ def log_err(txt, arg=None):
     sys.stderr.write(txt)
 
 def write_text(t, p):
+    if pack is not None:
+        pack.add(p, t.encode("utf-8"))
+        return
     try:
         f = open(p, "w")
     except:
@@ -75,52 +86,88 @@ def write_text(t, p):
     f.write(t.encode("utf-8"))
     f.close()
 
-try:
-    project = sys.argv[2]
-    mkdirs(project)
-    os.chdir(project)
-except:
-    log_err("Cannot create dir for project %s" % project)
-    sys.exit(1)
-
-textid = ""
-for l in f:
-    if not l.strip():
-        continue
-    data = json.loads(l)
-    if not data or not "type" in data:
-        log_err("JSON %s badly formatted, missing field type: %s" % (f, data))
+def json2arbo(filename, lines, project, packed=False):
+    global FILE, pack
+    FILE = filename
+    if packed:
+        try:
+            if os.path.dirname(project):
+                mkdirs(os.path.dirname(project))
+            pack = PackWriter(project + ".pack")
+        except:
+            log_err("Cannot create pack for project %s" % project)
+            raise ArboError()
+        try:
+            write_arbo(lines)
+        finally:
+            pack.close()
+            pack = None
+        return
+    cwd = os.getcwd()
+    try:
+        mkdirs(project)
+        os.chdir(project)
+    except:
+        log_err("Cannot create dir for project %s" % project)
+        raise ArboError()
+    try:
+        write_arbo(lines)
+    finally:
+        os.chdir(cwd)
+
+def write_arbo(lines):
+    textid = ""
+    for l in lines:
+        if not l.strip():
+            continue
+        data = json.loads(l)
+        if not data or not "type" in data:
+            log_err("JSON %s badly formatted, missing field type: %s" % (FILE, data))
+            raise ArboError()
+        if data["type"] == "texte":
+            textid = data["id"]
+    #   textid = date_formatted+"_"+data["id"]
+            write_text(clean_text(data["titre"]), textid+".titre")
+            alldata = dict(data)
+            alldata['sections'] = []
+            alldata['articles'] = []
+        elif textid == "":
+            log_err("JSON missing first line with text infos")
+            raise ArboError()
+        elif data["type"] == "section":
+            path = sec_path(data["id"])
+            mkdirs(path)
+            alldata['sections'].append(data)
+            write_json(data, path+"/"+textid+".json")
+            write_text(clean_text(data["titre"]), path+"/"+textid+".titre")
+        elif data["type"] == "article":
+            path = ""
+            if "section" in data:
+                path = sec_path(data["section"])+"/"
+            path += "A"+orderabledir(data["titre"])+"/"
+            mkdirs(path)
+            alldata['articles'].append(data)
+            write_json(data, path+textid+".json")
+            text = ""
+            for i in range(len(data["alineas"])):
+                if text != "":
+                    text += "\n"
+                text += clean_text(data["alineas"]["%03d" % (i+1)])
+            write_text(text, path+textid+".alineas")
+
+    write_json(alldata, "texte.json")
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if a != "--packed"]
+    try:
+        FILE = args[0]
+        f = open(FILE, "r")
+    except:
+        sys.stderr.write("ERROR: Cannot open json file %s\n" % FILE)
         sys.exit(1)
-    if data["type"] == "texte":
-        textid = data["id"]
-#   textid = date_formatted+"_"+data["id"]
-        write_text(clean_text(data["titre"]), textid+".titre")
-        alldata = dict(data)
-        alldata['sections'] = []
-        alldata['articles'] = []
-    elif textid == "":
-        log_err("JSON missing first line with text infos")
+    try:
+        json2arbo(FILE, f, args[1], "--packed" in sys.argv)
+    except ArboError:
         sys.exit(1)
-    elif data["type"] == "section":
-        path = sec_path(data["id"])
-        mkdirs(path)
-        alldata['sections'].append(data)
-        write_json(data, path+"/"+textid+".json")
-        write_text(clean_text(data["titre"]), path+"/"+textid+".titre")
-    elif data["type"] == "article":
-        path = ""
-        if "section" in data:
-            path = sec_path(data["section"])+"/"
-        path += "A"+orderabledir(data["titre"])+"/"
-        mkdirs(path)
-        alldata['articles'].append(data)
-        write_json(data, path+textid+".json")
-        text = ""
-        for i in range(len(data["alineas"])):
-            if text != "":
-                text += "\n"
-            text += clean_text(data["alineas"]["%03d" % (i+1)])
-        write_text(text, path+textid+".alineas")
-
-f.close()
-write_json(alldata, "texte.json")
+    finally:
+        f.close()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Content-addressed memoization of the collectdata python scripts
+
+Run with python memo.py [--max-size=MB] CACHEDIR SCRIPT.py [ARGS...]
+Runs SCRIPT.py ARGS with the current python unless an earlier run with the
+same inputs is stored in CACHEDIR, in which case its output is replayed.
+
+The key hashes the arguments, the content of every argument that is a file
+(e.g. the downloaded HTML or the previous steps JSON) and the source of the
+script and of the local modules it imports, so any change to the inputs or
+to the parser code triggers a new run. Only successful runs are stored and
+the least recently used entries are evicted past --max-size (256MB default),
+the size of the cache being kept as a running total so that it is only
+scanned again when over it."""
+
+import os, sys, re
+from hashlib import sha1
+from subprocess import Popen, PIPE
+
+re_local_import = re.compile(r'^\s*(?:from\s+(\w+)\s+import|import\s+([\w, ]+))', re.M)
+
+
+def code_version(script):
+    """Hash of a script and of the sibling modules it imports, recursively."""
+    h = sha1()
+    todo = [os.path.abspath(script)]
+    seen = set()
+    while todo:
+        path = todo.pop()
+        if path in seen or not os.path.isfile(path):
+            continue
+        seen.add(path)
+        with open(path, 'rb') as f:
+            src = f.read()
+        h.update(os.path.basename(path) + "\0" + sha1(src).hexdigest())
+        for frm, imp in re_local_import.findall(src):
+            for mod in (frm or imp).split(','):
+                todo.append(os.path.join(os.path.dirname(path), mod.strip() + '.py'))
+    return h.hexdigest()
+
+
+class MemoStore(object):
+
+    def __init__(self, cachedir, max_size=256*1024*1024):
+        self.cachedir = cachedir
+        self.max_size = max_size
+        self.size = None
+        if not os.path.isdir(cachedir):
+            os.makedirs(cachedir)
+
+    def key(self, script, args):
+        h = sha1(code_version(script))
+        for a in args:
+            h.update("\0" + a)
+            if os.path.isfile(a):
+                with open(a, 'rb') as f:
+                    h.update("\0" + sha1(f.read()).hexdigest())
+            else:
+                h.update("\0-")
+        return h.hexdigest()
+
+    def content_key(self, script, *parts):
+        """Key for in-process calls, hashing the given input contents."""
+        h = sha1(code_version(script))
+        for p in parts:
+            h.update("\0" + (sha1(p).hexdigest() if p is not None else "-"))
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cachedir, key[:2], key)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path + '.out', 'rb') as f:
+                out = f.read()
+            with open(path + '.err', 'rb') as f:
+                err = f.read()
+        except IOError:
+            return None
+        # Touch entries when read so eviction drops the least recently used
+        os.utime(path + '.out', None)
+        return out, err
+
+    def put(self, key, out, err):
+        path = self._path(key)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        for ext, content in (('.err', err), ('.out', out)):
+            with open(path + ext + '.tmp', 'wb') as f:
+                f.write(content)
+            os.rename(path + ext + '.tmp', path + ext)
+        if self.size is None:
+            self.size = sum(size for _, size, _ in self.entries())
+        else:
+            self.size += len(out) + len(err)
+        if self.size > self.max_size:
+            self.evict()
+
+    def entries(self):
+        for d in os.listdir(self.cachedir):
+            d = os.path.join(self.cachedir, d)
+            if not os.path.isdir(d):
+                continue
+            for name in os.listdir(d):
+                if not name.endswith('.out'):
+                    continue
+                path = os.path.join(d, name[:-4])
+                try:
+                    st = os.stat(path + '.out')
+                    size = st.st_size + os.path.getsize(path + '.err')
+                except OSError:
+                    continue
+                yield st.st_mtime, size, path
+
+    def evict(self):
+        entries = sorted(self.entries())
+        self.size = sum(size for _, size, _ in entries)
+        # Go a bit under the cap so that the next puts do not rescan
+        for _, size, path in entries:
+            if self.size <= self.max_size * 0.9:
+                break
+            for ext in ('.out', '.err'):
+                try:
+                    os.remove(path + ext)
+                except OSError:
+                    pass
+            self.size -= size
+
+    def run(self, script, args):
+        key = self.key(script, args)
+        res = self.get(key)
+        if res is not None:
+            return 0, res[0], res[1]
+        p = Popen([sys.executable, script] + args, stdout=PIPE, stderr=PIPE)
+        out, err = p.communicate()
+        if p.returncode == 0:
+            self.put(key, out, err)
+        return p.returncode, out, err
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    max_size = 256
+    while args and args[0].startswith('--'):
+        opt = args.pop(0)
+        if opt.startswith('--max-size='):
+            max_size = int(opt.split('=', 1)[1])
+    if len(args) < 2:
+        sys.stderr.write("ERROR: usage: python memo.py [--max-size=MB] CACHEDIR SCRIPT.py [ARGS...]\n")
+        exit(1)
+    code, out, err = MemoStore(args[0], max_size*1024*1024).run(args[1], args[2:])
+    sys.stdout.write(out)
+    sys.stderr.write(err)
+    exit(code)
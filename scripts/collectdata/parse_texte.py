@@ -2,17 +2,78 @@
 # -*- coding=utf-8 -*-
 """Common law parser for AN/Sénat
 
-Run with python parse_texte.py LAW_FILE
+Run with python parse_texte.py [--backend=html5lib|lxml] LAW_FILE [ORDER]
 where LAW_FILE results from perl download_loi.pl URL > LAW_FILE
 Outputs results to stdout
 
+Run with python parse_texte.py [--backend=...] --batch=OUTDIR [--jobs=N] LAW_FILE[:ORDER] ...
+to parse many texts at once, each one written to OUTDIR/basename(LAW_FILE)
+
+From python, TexteParser(backend).parse(LAW_FILE, ORDER) returns the list of
+records instead of printing them, or appends them as they are produced to the
+RecordWriter(FILE) given as third argument
+
+The default html5lib backend builds the whole document tree before walking
+its paragraphs, the lxml backend streams them one by one as they are parsed
+which is much faster and lighter on big texts, see bench_parse_texte.py to
+compare them on recorded texts.
+
 Dependencies :
-html5lib, beautifulsoup4, simplejson"""
+html5lib, beautifulsoup4, simplejson, lxml (optional)"""
 
-import sys, re, html5lib
+import os, sys, re, html5lib
 import simplejson as json
+from string import maketrans
 from bs4 import BeautifulSoup
 from sort_articles import bister
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+def html5lib_paragraphs(string):
+    soup = BeautifulSoup(string, "html5lib")
+    return soup.title.string, (str(p) for p in soup.find_all("p"))
+
+def lxml_paragraphs(string, chunksize=65536):
+    parser = etree.HTMLPullParser(events=('end',), tag=('title', 'p'), encoding='utf-8')
+    string = string.encode('utf-8')
+    def events():
+        for i in xrange(0, len(string), chunksize):
+            parser.feed(string[i:i+chunksize])
+            for _, el in parser.read_events():
+                yield el
+        parser.close()
+        for _, el in parser.read_events():
+            yield el
+    def paragraph(el):
+        html = etree.tostring(el, encoding='utf-8', method='html', with_tail=False)
+        # Free what was already read to keep memory flat
+        el.clear()
+        while el.getprevious() is not None:
+            del el.getparent()[0]
+        return html
+    def paragraphs(els):
+        for el in els:
+            if el.tag == 'p':
+                yield paragraph(el)
+    els = events()
+    title = None
+    before = []
+    for el in els:
+        if el.tag == 'title':
+            title = unicode(el.text or '')
+            break
+        before.append(paragraph(el))
+    if title is None:
+        # As soup.title is None with html5lib
+        raise ValueError("No title found")
+    return title, (p for src in (before, paragraphs(els)) for p in src)
+
+backends = {
+    "html5lib": html5lib_paragraphs,
+    "lxml": lxml_paragraphs
+}
 
 # Warning changing parenthesis in this regexp has multiple consequences throughout the code
 section_titles = "((chap|t)itre|volume|livre|tome|(sous-)?section)"
@@ -36,61 +97,6 @@ clean_legifrance_regexps = [
     (re.compile(r'<div[^>]*class="titreArt[^>]*>(.*?)\s*</div>', re.I), r'<p><b>\1</b></p>'),
 ]
 
-FILE = sys.argv[1]
-try:
-    with open(FILE, 'r') as f:
-        string = f.read()
-        try:
-            string = string.decode('utf-8')
-        except:
-            try:
-                string = string.decode('iso-8859-15')
-            except:
-                pass
-        if 'legifrance.gouv.fr' in FILE:
-            for reg, res in clean_legifrance_regexps:
-                string = reg.sub(res, string)
-        else:
-            for reg, res in clean_texte_regexps:
-                string = reg.sub(res, string)
-
-    definitif = re_definitif.search(string) is not None
-    soup = BeautifulSoup(string, "html5lib")
-except:
-    sys.stderr.write("ERROR: Cannot open file %s" % FILE)
-    exit(1)
-
-if (len(sys.argv) > 2) :
-    ORDER = "%02d_" % int(sys.argv[2])
-else:
-    ORDER = ''
-
-url = re.sub(r"^.*/http", "http", FILE)
-url = re.sub(r"%3A", ":", re.sub(r"%2F", "/", url))
-texte = {"type": "texte", "source": url, "definitif": definitif}
-# Generate Senat or AN ID from URL
-if "legifrance.gouv.fr" in url:
-    m = re.search(r"cidTexte=(JORFTEXT\d+)(\D|$)", url, re.I)
-    texte["id"] = ORDER + m.group(1)
-elif re.search(r"assemblee-?nationale", url, re.I):
-    m = re.search(r"/(\d+)/.+/(ta)?[\w\-]*(\d{4})[\.\-]", url, re.I)
-    numero = int(m.group(3))
-    texte["id"] = ORDER+"A" + m.group(1) + "-"
-    if m.group(2) is not None:
-        texte["id"] += m.group(2)
-    texte["id"] += str(numero)
-else:
-    m = re.search(r"(ta|l)?s?(\d\d)-(\d{1,3})\d?\.", url, re.I)
-    numero = int(m.group(3))
-    texte["id"] = ORDER+"S" + m.group(2) + "-"
-    if m.group(1) is not None:
-        texte["id"] += m.group(1)
-    texte["id"] += "%03d" % numero
-
-texte["titre"] = re_clean_title_legif.sub('', soup.title.string.strip())
-texte["expose"] = ""
-expose = False
-
 # Convert from roman numbers
 re_mat_romans = re.compile(r"[IVXCLDM]+", re.I)
 romans_map = zip(
@@ -112,10 +118,12 @@ upcase_accents = "ÇÀÂÄÉÈÊËÎÏÔÖÙÛÜ"
 locase_accents = "çàâäéèêëîïôöùûü"
 
 
+# Accents are mapped byte per byte on the utf-8 encoded text
+real_lower_table = maketrans(upcase_accents, locase_accents)
+
+
 def real_lower(text):
-    for a in upcase_accents:
-        text = text.replace(a, locase_accents[upcase_accents.find(a)])
-    return text.lower()
+    return text.translate(real_lower_table).lower()
 
 
 def lower_but_first(text):
@@ -139,48 +147,70 @@ re_clean_punc_space = re.compile(u'([°«»:;,\.!\?\]\)%€&\$])([^\s\)\.,\d"])'
 re_clean_spaces = re.compile(r'\s+')
 re_clean_coord = re.compile(r'^["\(]*(pour)?\s*coordination[\)\s\.]*$', re.I)
 # Clean html and special chars
-lower_inner_title = lambda x: x.group(1)+lower_but_first(x.group(3))+" "
+# Lines are decoded only once, character level mappings are done in a single
+# pass through a lookup table and each regexp is only run when the line
+# contains a string it cannot match without
+html_chars = dict([(c, u'"') for c in u"«»“”„‟❝❞＂〟〞〝"] +
+                  [(c, u"'") for c in u"’＇ߴ՚ʼ❛❜"] +
+                  [(c, u"-") for c in u"−‒–—―⁓‑‐⁃⏤"])
+re_html_chars = re.compile(u"[%s]" % u"".join(html_chars))
+html_tags = {"em": u"i", "strong": u"b", "p": u"", "span": u""}
+
+
+def clean_tag(x):
+    if not x.group(2):
+        return u""
+    tag = html_tags.get(x.group(2).lower(), x.group(2))
+    return x.group(1) + tag + u">" if tag else u""
+
+lower_inner_title = lambda x: x.group(1)+lower_but_first(x.group(3).encode('utf-8')).decode('utf-8')+u" "
+html_replace_quotes = [
+    ((u"<!--",), re.compile(ur"<!--.*?-->", re.I), u""),
+    ((u"<",), re.compile(ur"</?br/?>[«\"\s]+", re.I), u" "),
+    ((u"«", u"»"), re.compile(ur'(«\s+|\s+»)'), u'"'),
+]
 html_replace = [
-    (re.compile(r"−"), "-"),
-    (re.compile(r" "), " "),
-    (re.compile(r"<!--.*?-->", re.I), ""),
-    (re.compile(r"</?br/?>[«\"\s]+", re.I), " "),
-    (re.compile(r'(«\s+|\s+»)'), '"'),
-    (re.compile(r'(«|»|“|”|„|‟|❝|❞|＂|〟|〞|〝)'), '"'),
-    (re.compile(r"(’|＇|’|ߴ|՚|ʼ|❛|❜)"), "'"),
-    (re.compile(r"(‒|–|—|―|⁓|‑|‐|⁃|⏤)"), "-"),
-    (re.compile(r"(</?\w+)[^>]*>"), r"\1>"),
-    (re.compile(r"(</?)em>", re.I), r"\1i>"),
-    (re.compile(r"(</?)strong>", re.I), r"\1b>"),
-    (re.compile(r"<(![^>]*|/?(p|span))>", re.I), ""),
-    (re.compile(r"\s*\n+\s*"), " "),
-    (re.compile(r"<[^>]*></[^>]*>"), ""),
-    (re.compile(r"^<b><i>", re.I), "<i><b>"),
-    (re.compile(r"</b>(\s*)<b>", re.I), r"\1"),
-    (re.compile(r"</?sup>", re.I), ""),
-    (re.compile(r"^((<[bi]>)*)\((S|AN)[12]\)\s*", re.I), r"\1"),
-    (re.compile(r"^(<b>Article\s*)\d+\s*<s>\s*", re.I), r"\1"),
-    (re.compile(r"<s>(.*)</s>", re.I), ""),
-    (re.compile(r"</?s>", re.I), ""),
-    (re.compile(r"\s*</?img>\s*", re.I), ""),
-    (re.compile(r"œ([A-Z])"), r"OE\1"),
-    (re.compile(r"œ\s*", re.I), "oe"),
-    (re.compile(r'^((<[^>]*>)*")%s ' % section_titles, re.I), lower_inner_title),
-    (re.compile(r' pr..?liminaire', re.I), ' préliminaire'),
-    (re.compile(r'<strike>[^<]*</strike>', re.I), ''),
-    (re_clean_spaces, " "),
+    ((u"<",), re.compile(ur"(</?)(\w+)[^>]*>|<![^>]*>"), clean_tag),
+    ((u"\n",), re.compile(ur"\s*\n+\s*"), u" "),
+    ((u"></",), re.compile(ur"<[^>]*></[^>]*>"), u""),
+    ((u"<",), re.compile(ur"^<b><i>", re.I), u"<i><b>"),
+    ((u"<",), re.compile(ur"</b>(\s*)<b>", re.I), ur"\1"),
+    ((u"<",), re.compile(ur"</?sup>", re.I), u""),
+    ((u"(",), re.compile(ur"^((<[bi]>)*)\((S|AN)[12]\)\s*", re.I), ur"\1"),
+    ((u"<",), re.compile(ur"^(<b>Article\s*)\d+\s*<s>\s*", re.I), ur"\1"),
+    ((u"<",), re.compile(ur"<s>(.*)</s>", re.I), u""),
+    ((u"<",), re.compile(ur"</?s>", re.I), u""),
+    ((u"<",), re.compile(ur"\s*</?img>\s*", re.I), u""),
+    ((u"œ",), re.compile(ur"œ([A-Z])|œ\s*"), lambda x: u"OE"+x.group(1) if x.group(1) else u"oe"),
+    ((u'"',), re.compile(ur'^((<[^>]*>)*")%s ' % section_titles, re.I), lower_inner_title),
+    # One or two bytes once utf-8 encoded between pr and liminaire
+    ((), re.compile(ur' pr(?:[^\n\u0800-\uffff]|[^\n\x80-\uffff]{2})liminaire', re.I), u' préliminaire'),
+    ((u"<",), re.compile(ur'<strike>[^<]*</strike>', re.I), u''),
+    ((), re.compile(ur'\s+'), u" "),
 ]
 
 
-def clean_html(t):
-    for regex, repl in html_replace:
+def apply_replacements(t, replacements):
+    for triggers, regex, repl in replacements:
+        if triggers:
+            for trig in triggers:
+                if trig in t:
+                    break
+            else:
+                continue
         t = regex.sub(repl, t)
-    return t.strip()
+    return t
+
+
+def clean_html(t):
+    t = apply_replacements(t.decode('utf-8').replace(u"\xa0", u" "), html_replace_quotes)
+    t = apply_replacements(re_html_chars.sub(lambda x: html_chars[x.group(0)], t), html_replace)
+    return t.encode('utf-8').strip()
 
 re_clean_et = re.compile(r'(,|\s+et)\s+', re.I)
 
 
-def pr_js(dic):
+def pr_js(dic, records):
     # Clean empty articles with only "Supprimé" as text
     if not dic:
         return
@@ -195,18 +225,32 @@ def pr_js(dic):
             for d in multiples:
                 new = dict(dic)
                 new['titre'] = d
-                print json.dumps(new, sort_keys=True, ensure_ascii=False).encode("utf-8")
+                records.append(new)
             return
-    print json.dumps(dic, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    records.append(dict(dic))
 
 
-def save_text(txt):
+def save_text(txt, records):
     if "done" not in txt:
-        pr_js(txt)
+        pr_js(txt, records)
     txt["done"] = True
     return txt
 
 
+def write_records(records, out):
+    for dic in records:
+        out.write(json.dumps(dic, sort_keys=True, ensure_ascii=False).encode("utf-8") + "\n")
+
+
+class RecordWriter(object):
+    """Stands for the list of records, writing each one to out when appended."""
+    def __init__(self, out):
+        self.out = out
+
+    def append(self, dic):
+        write_records([dic], self.out)
+
+
 blank_none = lambda x: x if x else ""
 re_cl_html = re.compile(r"<[^>]+>")
 re_cl_html_except_tables = re.compile(r"</?[^t/][^>]*>", re.I)
@@ -245,152 +289,280 @@ re_clean_footer_notes = re.compile(r"[\.\s]*\(*\d*\([\d\*]+[\)\d\*\.\s]*$")
 re_sep_text = re.compile(r'\s*<b>\s*(article|%s)\s*(I|uniqu|pr..?limina|1|prem)[ier]*\s*</b>\s*$' % section_titles, re.I)
 re_stars = re.compile(r'^[\s*_]+$')
 re_art_uni = re.compile(r'\s*article\s*unique\s*$', re.I)
-read = art_num = ali_num = 0
-section_id = ""
-article = None
-indextext = -1
-curtext = -1
-srclst = []
-section = {"type": "section", "id": ""}
-
-for text in soup.find_all("p"):
-    line = clean_html(str(text))
-
-    if re_stars.match(line):
-        continue
-    if line == "<b>RAPPORT</b>" or line == "Mesdames, Messieurs,":
-        read = -1
-    if (srclst or indextext != -1) and re_sep_text.match(line):
-        curtext += 1
-        art_num = 0
-    srcl = re_src_mult.search(line)
-    cl_line = re_cl_html.sub("", line).strip()
-    if srcl and read < 1:
-        srclst.append(int(srcl.group(1)))
-        continue
-    elif re_rap_mult.match(line):
-        line = cl_line
-        line = re_clean_mult_1.sub(",", line)
-        line = re_clean_mult_2.sub("", line)
-        cl_line = re_cl_html.sub("", line).strip()
-        for n_t in line.split(','):
-            indextext += 1
-            if int(n_t) == numero:
-                break
-    elif re_mat_ppl.match(line) or re_mat_tco.match(line):
-        read = 0
-        texte = save_text(texte)
-    elif re_mat_exp.match(line):
-        read = -1 # Deactivate description lecture
-        expose = True
-    elif re_echec_cmp.search(cl_line) or re_echec_com.search(cl_line) or re_echec_hemi.match(cl_line) or re_echec_hemi2.search(cl_line):
-        texte = save_text(texte)
-        pr_js({"type": "echec", "texte": cl_line})
-        break
-    elif read == -1 or (indextext != -1 and curtext != indextext):
-        continue
-
-    # Identify section zones
-    m = re_mat_sec.match(line)
-    if m:
-        read = 1 # Activate titles lecture
-        section["type_section"] = real_lower(m.group(1))
-        section_typ = m.group(1).upper()[0]
-        if m.group(3) is not None:
-            section_typ += "S"
-
-        if " LIMINAIRE" in line:
-            section_num = "L"
-        else:
-            section_num = re_cl_uno.sub('1', re_cl_sec_uno.sub('1', re_cl_html.sub('', m.group(5).strip())).strip())
-            section_num = re_clean_bister.sub(lambda m: m.group(1)+" "+real_lower(m.group(2)), section_num)
-            section_num = re_mat_new.sub('', section_num).strip()
-            m2 = re_mat_romans.match(section_num)
-            if m2:
-                rest = section_num.replace(m2.group(0), '')
-                section_num = romans(m2.group(0))
-                if rest: section_num = str(section_num) + rest
-        # Get parent section id to build current section id
-        section_par = re.sub(r""+section_typ+"[\dL].*$", "", section["id"])
-        section["id"] = section_par + section_typ + str(section_num)
-
-    # Identify titles and new article zones
-    elif (not expose and re_mat_end.match(line)) or (read == 2 and re_mat_ann.match(line)):
-        break
-    elif re.match(r"(<i>)?<b>", line) or re_art_uni.match(line) or re.match(r"^Article ", line):
-        line = cl_line
-        # Read a new article
-        if re_mat_art.match(line):
-            if article is not None:
-                texte = save_text(texte)
-                pr_js(article)
-            read = 2 # Activate alineas lecture
-            expose = False
-            art_num += 1
-            ali_num = 0
-            article = {"type": "article", "order": art_num, "alineas": {}, "statut": "none"}
-            if srclst:
-                article["source_text"] = srclst[curtext]
-            m = re_mat_art.match(line)
-            article["titre"] = re_cl_uno.sub("1er", re_cl_sec_uno.sub("1er", m.group(1).strip())).strip(" -'")
-            if m.group(2) is not None:
-                article["statut"] = re_cl_par.sub("", real_lower(m.group(2))).strip()
-            if section["id"] != "":
-                article["section"] = section["id"]
-        # Read a section's title
-        elif read == 1:
-            texte = save_text(texte)
-            section["titre"] = lower_but_first(line)
-            if article is not None:
-                pr_js(article)
-                article = None
-            pr_js(section)
-            read = 0
-
-    # Read articles with alineas
-    if read == 2 and not m:
-        # Find extra status information
-        if ali_num == 0 and re_mat_st.match(line):
-            article["statut"] = re_cl_html.sub("", re_cl_par.sub("", real_lower(line)).strip())
-            continue
-        if re_mat_dots.match(line):
-            continue
-        if "<table>" in line:
-            cl_line = cl_html_except_tables(line)
-        line = re_clean_art_spaces2.sub('. - ', re_clean_art_spaces.sub(r'\1', re_clean_idx_spaces.sub(r'\1. ', re_mat_new.sub(" ", cl_line).strip())))
-        # Clean low/upcase issues with BIS TER etc.
-        line = line.replace("oeUVRE", "OEUVRE")
-        line = clean_full_upcase(line)
-        line = re_clean_premier.sub(lambda m: (real_lower(m.group(0)) if m.group(1) else "")+m.group(3)+"er", line)
-        line = re_clean_bister.sub(lambda m: m.group(1)+" "+real_lower(m.group(2)), line)
-        # Clean different versions of same comment.
-        line = re_clean_supr.sub('(Supprimé)', line)
-        line = re_clean_conf.sub('(Non modifié)', line)
-        line = re_clean_coord.sub('', line)
-        line = re_clean_subsec_space.sub(r'\1\4 \5', line)
-        line = re_clean_subsec_space2.sub(r'\1 \2 \3\4', line)
+
+
+def read_texte(path):
+    with open(path, 'r') as f:
+        string = f.read()
+    try:
+        string = string.decode('utf-8')
+    except:
         try:
-            tmp = line.decode('utf-8')
+            string = string.decode('iso-8859-15')
         except:
-            try:
-                tmp = line.decode('iso-8859-1')
-            except:
-                tmp = line
-        line = re_clean_punc_space.sub(r'\1 \2', tmp).encode('utf-8')
-        line = re_clean_spaces.sub(' ', line)
-        line = re_mat_sec.sub(lambda x: lower_but_first(x.group(1))+x.group(4) if re_mat_n.match(x.group(4)) else x.group(0), line)
-        line = re_clean_footer_notes.sub(".", line)
-        # Clean comments (Texte du Sénat), (Texte de la Commission), ...
-        if ali_num == 0 and re_mat_texte.match(line):
-            continue
-        line = re_mat_single_char.sub("", line)
-        line = line.strip()
-        if line:
-            ali_num += 1
-            article["alineas"]["%03d" % ali_num] = line
+            pass
+    if 'legifrance.gouv.fr' in path:
+        for reg, res in clean_legifrance_regexps:
+            string = reg.sub(res, string)
     else:
-        #metas
-        continue
+        for reg, res in clean_texte_regexps:
+            string = reg.sub(res, string)
+    return string
 
-save_text(texte)
-pr_js(article)
+
+class TexteParser(object):
+    """Parse a law text into its texte, section and article records.
+    No state is kept between calls so one parser can handle many files."""
+
+    def __init__(self, backend="html5lib"):
+        if backend not in backends or (backend == "lxml" and etree is None):
+            raise ValueError("Parser backend %s is not available" % backend)
+        self.backend = backend
+
+    def parse(self, path, order=None, records=None):
+        try:
+            string = read_texte(path)
+            definitif = re_definitif.search(string) is not None
+            title, paragraphs = backends[self.backend](string)
+        except Exception:
+            raise IOError("Cannot open file %s" % path)
+
+        ORDER = "%02d_" % int(order) if order is not None else ''
+
+        url = re.sub(r"^.*/http", "http", path)
+        url = re.sub(r"%3A", ":", re.sub(r"%2F", "/", url))
+        texte = {"type": "texte", "source": url, "definitif": definitif}
+        # Generate Senat or AN ID from URL
+        if "legifrance.gouv.fr" in url:
+            m = re.search(r"cidTexte=(JORFTEXT\d+)(\D|$)", url, re.I)
+            texte["id"] = ORDER + m.group(1)
+        elif re.search(r"assemblee-?nationale", url, re.I):
+            m = re.search(r"/(\d+)/.+/(ta)?[\w\-]*(\d{4})[\.\-]", url, re.I)
+            numero = int(m.group(3))
+            texte["id"] = ORDER+"A" + m.group(1) + "-"
+            if m.group(2) is not None:
+                texte["id"] += m.group(2)
+            texte["id"] += str(numero)
+        else:
+            m = re.search(r"(ta|l)?s?(\d\d)-(\d{1,3})\d?\.", url, re.I)
+            numero = int(m.group(3))
+            texte["id"] = ORDER+"S" + m.group(2) + "-"
+            if m.group(1) is not None:
+                texte["id"] += m.group(1)
+            texte["id"] += "%03d" % numero
+
+        texte["titre"] = re_clean_title_legif.sub('', title.strip())
+        texte["expose"] = ""
+        expose = False
+
+        if records is None:
+            records = []
+        read = art_num = ali_num = 0
+        section_id = ""
+        article = None
+        indextext = -1
+        curtext = -1
+        srclst = []
+        section = {"type": "section", "id": ""}
+
+        for text in paragraphs:
+            line = clean_html(text)
+
+            if re_stars.match(line):
+                continue
+            if line == "<b>RAPPORT</b>" or line == "Mesdames, Messieurs,":
+                read = -1
+            if (srclst or indextext != -1) and re_sep_text.match(line):
+                curtext += 1
+                art_num = 0
+            srcl = re_src_mult.search(line)
+            cl_line = re_cl_html.sub("", line).strip()
+            if srcl and read < 1:
+                srclst.append(int(srcl.group(1)))
+                continue
+            elif re_rap_mult.match(line):
+                line = cl_line
+                line = re_clean_mult_1.sub(",", line)
+                line = re_clean_mult_2.sub("", line)
+                cl_line = re_cl_html.sub("", line).strip()
+                for n_t in line.split(','):
+                    indextext += 1
+                    if int(n_t) == numero:
+                        break
+            elif re_mat_ppl.match(line) or re_mat_tco.match(line):
+                read = 0
+                texte = save_text(texte, records)
+            elif re_mat_exp.match(line):
+                read = -1 # Deactivate description lecture
+                expose = True
+            elif re_echec_cmp.search(cl_line) or re_echec_com.search(cl_line) or re_echec_hemi.match(cl_line) or re_echec_hemi2.search(cl_line):
+                texte = save_text(texte, records)
+                pr_js({"type": "echec", "texte": cl_line}, records)
+                break
+            elif read == -1 or (indextext != -1 and curtext != indextext):
+                continue
+
+            # Identify section zones
+            m = re_mat_sec.match(line)
+            if m:
+                read = 1 # Activate titles lecture
+                section["type_section"] = real_lower(m.group(1))
+                section_typ = m.group(1).upper()[0]
+                if m.group(3) is not None:
+                    section_typ += "S"
+
+                if " LIMINAIRE" in line:
+                    section_num = "L"
+                else:
+                    section_num = re_cl_uno.sub('1', re_cl_sec_uno.sub('1', re_cl_html.sub('', m.group(5).strip())).strip())
+                    section_num = re_clean_bister.sub(lambda m: m.group(1)+" "+real_lower(m.group(2)), section_num)
+                    section_num = re_mat_new.sub('', section_num).strip()
+                    m2 = re_mat_romans.match(section_num)
+                    if m2:
+                        rest = section_num.replace(m2.group(0), '')
+                        section_num = romans(m2.group(0))
+                        if rest: section_num = str(section_num) + rest
+                # Get parent section id to build current section id
+                section_par = re.sub(r""+section_typ+"[\dL].*$", "", section["id"])
+                section["id"] = section_par + section_typ + str(section_num)
+
+            # Identify titles and new article zones
+            elif (not expose and re_mat_end.match(line)) or (read == 2 and re_mat_ann.match(line)):
+                break
+            elif re.match(r"(<i>)?<b>", line) or re_art_uni.match(line) or re.match(r"^Article ", line):
+                line = cl_line
+                # Read a new article
+                if re_mat_art.match(line):
+                    if article is not None:
+                        texte = save_text(texte, records)
+                        pr_js(article, records)
+                    read = 2 # Activate alineas lecture
+                    expose = False
+                    art_num += 1
+                    ali_num = 0
+                    article = {"type": "article", "order": art_num, "alineas": {}, "statut": "none"}
+                    if srclst:
+                        article["source_text"] = srclst[curtext]
+                    m = re_mat_art.match(line)
+                    article["titre"] = re_cl_uno.sub("1er", re_cl_sec_uno.sub("1er", m.group(1).strip())).strip(" -'")
+                    if m.group(2) is not None:
+                        article["statut"] = re_cl_par.sub("", real_lower(m.group(2))).strip()
+                    if section["id"] != "":
+                        article["section"] = section["id"]
+                # Read a section's title
+                elif read == 1:
+                    texte = save_text(texte, records)
+                    section["titre"] = lower_but_first(line)
+                    if article is not None:
+                        pr_js(article, records)
+                        article = None
+                    pr_js(section, records)
+                    read = 0
+
+            # Read articles with alineas
+            if read == 2 and not m:
+                # Find extra status information
+                if ali_num == 0 and re_mat_st.match(line):
+                    article["statut"] = re_cl_html.sub("", re_cl_par.sub("", real_lower(line)).strip())
+                    continue
+                if re_mat_dots.match(line):
+                    continue
+                if "<table>" in line:
+                    cl_line = cl_html_except_tables(line)
+                line = re_clean_art_spaces2.sub('. - ', re_clean_art_spaces.sub(r'\1', re_clean_idx_spaces.sub(r'\1. ', re_mat_new.sub(" ", cl_line).strip())))
+                # Clean low/upcase issues with BIS TER etc.
+                line = line.replace("oeUVRE", "OEUVRE")
+                line = clean_full_upcase(line)
+                line = re_clean_premier.sub(lambda m: (real_lower(m.group(0)) if m.group(1) else "")+m.group(3)+"er", line)
+                line = re_clean_bister.sub(lambda m: m.group(1)+" "+real_lower(m.group(2)), line)
+                # Clean different versions of same comment.
+                line = re_clean_supr.sub('(Supprimé)', line)
+                line = re_clean_conf.sub('(Non modifié)', line)
+                line = re_clean_coord.sub('', line)
+                line = re_clean_subsec_space.sub(r'\1\4 \5', line)
+                line = re_clean_subsec_space2.sub(r'\1 \2 \3\4', line)
+                try:
+                    tmp = line.decode('utf-8')
+                except:
+                    try:
+                        tmp = line.decode('iso-8859-1')
+                    except:
+                        tmp = line
+                line = re_clean_punc_space.sub(r'\1 \2', tmp).encode('utf-8')
+                line = re_clean_spaces.sub(' ', line)
+                line = re_mat_sec.sub(lambda x: lower_but_first(x.group(1))+x.group(4) if re_mat_n.match(x.group(4)) else x.group(0), line)
+                line = re_clean_footer_notes.sub(".", line)
+                # Clean comments (Texte du Sénat), (Texte de la Commission), ...
+                if ali_num == 0 and re_mat_texte.match(line):
+                    continue
+                line = re_mat_single_char.sub("", line)
+                line = line.strip()
+                if line:
+                    ali_num += 1
+                    article["alineas"]["%03d" % ali_num] = line
+            else:
+                #metas
+                continue
+
+        save_text(texte, records)
+        pr_js(article, records)
+        return records
+
+
+parsers = {}
+def parse_to_file(task):
+    path, order, outdir, backend = task
+    if backend not in parsers:
+        parsers[backend] = TexteParser(backend)
+    try:
+        records = parsers[backend].parse(path, order)
+        with open(os.path.join(outdir, os.path.basename(path)), 'w') as f:
+            write_records(records, f)
+    except Exception as e:
+        return path, "%s: %s" % (type(e).__name__, e)
+    return path, None
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    opts = dict((a[2:].split('=', 1) + [''])[:2] for a in sys.argv[1:] if a.startswith('--'))
+    backend = opts.get("backend", "html5lib")
+    if backend not in backends or (backend == "lxml" and etree is None):
+        sys.stderr.write("ERROR: Parser backend %s is not available\n" % backend)
+        exit(1)
+
+    if "batch" not in opts:
+        try:
+            TexteParser(backend).parse(args[0], args[1] if len(args) > 1 else None, RecordWriter(sys.stdout))
+        except IOError as e:
+            sys.stderr.write("ERROR: %s" % e)
+            exit(1)
+        exit(0)
+
+    # Batch mode: LAW_FILE[:ORDER] arguments parsed in one or several processes
+    outdir = opts["batch"]
+    if not outdir:
+        sys.stderr.write("ERROR: --batch needs an output directory, as in --batch=OUTDIR\n")
+        exit(1)
+    if not os.path.isdir(outdir):
+        os.makedirs(outdir)
+    tasks = []
+    for a in args:
+        path, _, order = a.partition(':')
+        tasks.append((path, order or None, outdir, backend))
+    jobs = int(opts.get("jobs") or 1)
+    if jobs > 1:
+        from multiprocessing import Pool
+        pool = Pool(jobs)
+        results = pool.imap_unordered(parse_to_file, tasks)
+    else:
+        results = (parse_to_file(t) for t in tasks)
+    errors = 0
+    for path, err in results:
+        if err:
+            errors += 1
+            sys.stderr.write("ERROR parsing %s: %s\n" % (path, err))
+    if jobs > 1:
+        pool.close()
+        pool.join()
+    exit(1 if errors else 0)
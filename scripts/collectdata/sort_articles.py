@@ -102,8 +102,31 @@ def compare_articles(a, b):
         ib += 1
     return ia - ib
 
+# Sort keys ordering titles like compare_articles, computed once per title
+sort_keys = {}
+def article_sort_key(a):
+    try:
+        return sort_keys[a]
+    except KeyError:
+        pass
+    na = split_article(a)
+    # each detail keyed on its type then alpha order or bis-ter value, the
+    # final (0,) stands for the None padding compare_articles compares with
+    details = []
+    for d in na[1:]:
+        t = type_detail(d)
+        details.append((t, quantify_bis(d) if t > 0 else d))
+    details.append((0,))
+    offset = 0
+    if 'avant' in a.lower():
+        offset = -1
+    elif u'après' in a.lower():
+        offset = 1
+    key = sort_keys[a] = (na[0], tuple(details), offset)
+    return key
+
 def article_is_lower(a, b):
-    return compare_articles(a, b) < 0
+    return article_sort_key(a) < article_sort_key(b)
 
 if __name__ == "__main__":
 
@@ -128,10 +151,10 @@ if __name__ == "__main__":
       "1er A bis A",
       "1er A bis",
       "1er B",
-      "Après l'article 1er B",
+      u"Après l'article 1er B",
       "Avant l'article 1er C",
       "1er C",
-      "Après l'article 1er D",
+      u"Après l'article 1er D",
       "avant l'article 1er",
       "1er",
       "Avant l'article 10 quater",
@@ -173,3 +196,24 @@ if __name__ == "__main__":
     assert(random_arts == sorted_arts)
     print " -> Success!"
 
+    # Test sort keys order as compare_articles
+    print "[TEST] Sorting randomized array of articles with keys:"
+    random.shuffle(random_arts)
+    assert(sorted(random_arts, key=article_sort_key) == sorted_arts)
+    print " -> Success!"
+
+    print "[TEST] Comparing keys order to compare_articles on random titles:"
+    def random_title():
+        if random.random() < 0.05:
+            return random.choice(["wrong name", "Titre", "Annexe", "Intitule", "decision"]) + " %s" % random.choice(["", "A", "avant", "bis"])
+        t = str(random.randint(1, 20)) + random.choice(["", "er"])
+        for _ in range(random.randint(0, 3)):
+            t += " " + random.choice(["A", "B", "C", "Z", "AA", "AB", "BA"] + bis_27[:random.randint(1, len(bis_27))])
+        return random.choice(["", "", "Article ", "Avant l'article ", u"Après l'article ", "article additionnel avant l'article "]) + t
+    titles = [random_title() for _ in range(2000)]
+    sign = lambda x: (x > 0) - (x < 0)
+    for a, b in zip(titles, titles[1:] + titles[:1]):
+        assert(sign(compare_articles(a, b)) == sign(cmp(article_sort_key(a), article_sort_key(b)))), (a, b)
+    assert(sorted(titles, compare_articles) == sorted(titles, key=article_sort_key))
+    print " -> Success!"
+
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Single file store for the texts arborescence written by json2arbo.py
+
+A pack is an append-only file: a header, the content of each file one after
+the other, then a json table of contents mapping each relative path to its
+offset and length, and finally a trailer giving the position of that table.
+Adding files to an existing pack rewrites only the table of contents.
+
+Run with python textpack.py list PACK
+      or python textpack.py cat PACK PATH
+      or python textpack.py expand PACK [DIR]
+to expand a pack back into the usual files layout (DIR defaults to the pack
+path without its .pack extension)"""
+
+import os, sys, struct
+from collections import OrderedDict
+try:
+    import json
+except:
+    import simplejson as json
+
+MAGIC = "TEXTPACK1\n"
+TRAILER = struct.Struct(">Q4s")
+TRAILER_MAGIC = "TPK1"
+
+
+class PackError(Exception):
+    pass
+
+
+def read_toc(f):
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    if size < len(MAGIC) + TRAILER.size:
+        raise PackError("File too short to be a pack")
+    f.seek(0)
+    if f.read(len(MAGIC)) != MAGIC:
+        raise PackError("Missing pack header")
+    f.seek(size - TRAILER.size)
+    tocpos, magic = TRAILER.unpack(f.read(TRAILER.size))
+    if magic != TRAILER_MAGIC or tocpos > size - TRAILER.size:
+        raise PackError("Missing pack trailer")
+    f.seek(tocpos)
+    toc = json.loads(f.read(size - TRAILER.size - tocpos), object_pairs_hook=OrderedDict)
+    return tocpos, toc
+
+
+class PackWriter(object):
+    """Write files into a pack, appending to it if it already exists."""
+
+    def __init__(self, path, append=False):
+        self.path = path
+        if append and os.path.exists(path):
+            self.f = open(path, "r+b")
+            self.pos, self.toc = read_toc(self.f)
+            self.f.seek(self.pos)
+            self.f.truncate()
+        else:
+            self.f = open(path, "wb")
+            self.f.write(MAGIC)
+            self.pos = len(MAGIC)
+            self.toc = OrderedDict()
+
+    def add(self, name, content):
+        self.f.write(content)
+        self.toc[name] = [self.pos, len(content)]
+        self.pos += len(content)
+
+    def close(self):
+        self.f.write(json.dumps(self.toc, ensure_ascii=False, separators=(',', ':')).encode("utf-8"))
+        self.f.write(TRAILER.pack(self.pos, TRAILER_MAGIC))
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class PackReader(object):
+
+    def __init__(self, path):
+        self.path = path
+        self.f = open(path, "rb")
+        _, self.toc = read_toc(self.f)
+
+    def names(self):
+        return self.toc.keys()
+
+    def read(self, name):
+        try:
+            pos, length = self.toc[name]
+        except KeyError:
+            raise PackError("No file %s in pack %s" % (name, self.path))
+        self.f.seek(pos)
+        return self.f.read(length)
+
+    def expand(self, directory):
+        """Recreate the files of the pack under directory."""
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        made = set()
+        for name in self.toc:
+            path = os.path.join(directory, name.encode("utf-8") if isinstance(directory, str) else name)
+            d = os.path.dirname(path)
+            if d not in made:
+                if not os.path.isdir(d):
+                    os.makedirs(d)
+                made.add(d)
+            with open(path, "wb") as out:
+                out.write(self.read(name))
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if len(args) < 2 or args[0] not in ("list", "cat", "expand"):
+        sys.stderr.write("ERROR: usage: python textpack.py list|cat|expand PACK [PATH|DIR]\n")
+        exit(1)
+    try:
+        with PackReader(args[1]) as pack:
+            if args[0] == "list":
+                for name in pack.names():
+                    print name.encode("utf-8")
+            elif args[0] == "cat":
+                sys.stdout.write(pack.read(args[2].decode("utf-8")))
+            else:
+                pack.expand(args[2] if len(args) > 2 else os.path.splitext(args[1])[0])
+    except (IOError, PackError) as e:
+        sys.stderr.write("ERROR: %s\n" % e)
+        exit(1)
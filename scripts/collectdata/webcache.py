@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Bounded store of the downloaded web resources, shared by fetch.py runs
+
+Run with python webcache.py stats CACHEDIR
+      or python webcache.py cat CACHEDIR URL
+      or python webcache.py [--max-size=MB] evict CACHEDIR
+
+Each url is stored in a single file named after its uri-escaped form plus a
+.z extension: a json line of metadata (http status, ETag, Last-Modified)
+followed by the zlib compressed body. Entries are written to a temporary file
+then renamed, so readers never need a lock. Downloads of a given url and
+evictions hold flock locks, so that several dossiers jobs can share the cache.
+The least recently used entries are evicted past --max-size (1024MB default).
+
+Raw files left by the former cache layout are read and converted on access."""
+
+import os, sys, re, zlib, fcntl, urllib, tempfile
+from threading import Lock
+from contextlib import contextmanager
+try:
+    import json
+except:
+    import simplejson as json
+
+EXT = ".z"
+LOCK_STRIPES = 64
+
+
+def escapeit(url):
+    return re.sub(r'\s', '_', urllib.quote(url, safe='~'))
+
+
+@contextmanager
+def flocked(path, flags=fcntl.LOCK_EX):
+    """Hold a flock on path, yields False when LOCK_NB is given and it is busy."""
+    with open(path, "a") as f:
+        try:
+            fcntl.flock(f, flags)
+        except IOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class WebCache(object):
+
+    def __init__(self, cachedir, max_size=1024*1024*1024):
+        self.cachedir = cachedir
+        self.max_size = max_size
+        self.size = None
+        self.stats = {"hits": 0, "misses": 0, "revalidated": 0, "refreshed": 0, "evicted": 0}
+        self.statslock = Lock()
+        self.lockdir = os.path.join(cachedir, ".locks")
+        if not os.path.isdir(self.lockdir):
+            os.makedirs(self.lockdir)
+
+    def count(self, stat):
+        with self.statslock:
+            self.stats[stat] += 1
+
+    def _path(self, url):
+        return os.path.join(self.cachedir, escapeit(url))
+
+    def lock(self, url):
+        """Lock held while downloading url, one of a fixed set of lock files."""
+        return flocked(os.path.join(self.lockdir, "%02d" % (zlib.crc32(url) % LOCK_STRIPES)))
+
+    def has(self, url):
+        path = self._path(url)
+        return os.path.exists(path + EXT) or os.path.exists(path)
+
+    def lookup(self, url):
+        """Return the (metadata, body) stored for url, or None."""
+        path = self._path(url)
+        try:
+            with open(path + EXT, "rb") as f:
+                meta = json.loads(f.readline())
+                body = zlib.decompress(f.read())
+        except (ValueError, zlib.error):
+            return None
+        except IOError:
+            try:
+                with open(path, "rb") as f:
+                    body = f.read()
+            except IOError:
+                return None
+            meta = {"status": 404 if body == "\n" else 200}
+            self.store(url, meta, body)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return meta, body
+        # Touch entries when read so eviction drops the least recently used
+        os.utime(path + EXT, None)
+        return meta, body
+
+    def store(self, url, meta, body):
+        fd, tmp = tempfile.mkstemp(dir=self.cachedir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(json.dumps(meta) + "\n")
+            f.write(zlib.compress(body))
+            written = f.tell()
+        os.rename(tmp, self._path(url) + EXT)
+        with self.statslock:
+            if self.size is None:
+                self.size = sum(size for _, size, _ in self.entries())
+            else:
+                self.size += written
+            full = self.size > self.max_size
+        if full:
+            self.evict()
+
+    def touch(self, url):
+        os.utime(self._path(url) + EXT, None)
+
+    def entries(self):
+        for name in os.listdir(self.cachedir):
+            if not name.endswith(EXT):
+                continue
+            path = os.path.join(self.cachedir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            yield st.st_mtime, st.st_size, path
+
+    def evict(self):
+        with flocked(os.path.join(self.lockdir, "evict"), fcntl.LOCK_EX | fcntl.LOCK_NB) as locked:
+            if not locked:
+                return
+            entries = sorted(self.entries())
+            self.size = sum(size for _, size, _ in entries)
+            # Go a bit under the cap so that the next stores do not rescan
+            for _, size, path in entries:
+                if self.size <= self.max_size * 0.9:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                self.size -= size
+                self.count("evicted")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    max_size = 1024
+    while args and args[0].startswith('--'):
+        opt = args.pop(0)
+        if opt.startswith('--max-size='):
+            max_size = int(opt.split('=', 1)[1])
+    if len(args) < 2 or args[0] not in ("stats", "cat", "evict") or (args[0] == "cat" and len(args) < 3):
+        sys.stderr.write("ERROR: usage: python webcache.py [--max-size=MB] stats|cat|evict CACHEDIR [URL]\n")
+        exit(1)
+    cache = WebCache(args[1], max_size*1024*1024)
+    if args[0] == "cat":
+        entry = cache.lookup(args[2])
+        if entry is None:
+            sys.stderr.write("ERROR: %s is not in the cache\n" % args[2])
+            exit(1)
+        sys.stdout.write(entry[1])
+    else:
+        if args[0] == "evict":
+            cache.evict()
+        entries = list(cache.entries())
+        print "%d entries, %.1fMB, %d evicted" % (len(entries), sum(size for _, size, _ in entries) / 1048576., cache.stats["evicted"])
@@ -1,7 +1,7 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import sys, os
+import sys, os, time
 from common import open_json, print_json, amendementIsFromGouvernement
 
 
@@ -141,12 +141,47 @@ class CountAmendementComputation(object):
 #######################################################
 
 class  DossierWalker(object):
-
-    def __init__(self, id, computationClass):
+    """Walk the files of a dossier once, handing each record to every one of
+    the computations given (a single one or a list). Computations may only
+    define the compute* methods they need. Each file is parsed at most once
+    per walk and their paths are kept in paths, the time spent loading files
+    is kept in loadTime and the time spent in each computation in
+    computeTimes, see timings()."""
+
+    def __init__(self, id, computations):
         self.id = id;
-        self.computationClass = computationClass
+        if not isinstance(computations, (list, tuple)):
+            computations = [computations]
+        self.computations = list(computations)
         self.procedurePath = os.path.join("data",self.id, "procedure")
         self.vizPath = os.path.join("data",self.id, "viz")
+        self.files = {}
+        self.paths = set()
+        self.loadTime = 0.
+        self.computeTimes = [0.] * len(self.computations)
+
+    def load(self, directory, filename):
+        path = os.path.join(directory, filename)
+        if path not in self.files:
+            start = time.time()
+            self.files[path] = open_json(directory, filename)
+            self.paths.add(path)
+            self.loadTime += time.time() - start
+        return self.files[path]
+
+    def dispatch(self, method, records):
+        for i, computation in enumerate(self.computations):
+            compute = getattr(computation, method, None)
+            if compute is None:
+                continue
+            start = time.time()
+            for record in records:
+                compute(record)
+            self.computeTimes[i] += time.time() - start
+
+    def timings(self):
+        """Return the load time then the (computation class name, time) pairs."""
+        return self.loadTime, [(c.__class__.__name__, t) for c, t in zip(self.computations, self.computeTimes)]
 
     def step_walker(self,step):
 
@@ -158,10 +193,8 @@ class  DossierWalker(object):
                 print "ERROR > No Amendements Directory "
                 return;
 
-            amendements = open_json(amdtDir, "amendements.json")
-            for amendement in amendements["amendements"]:
-                self.computationClass.computeAmendements(amendement)
-               # print ">>%s"% amendement["amendement"]["id"]
+            amendements = self.load(amdtDir, "amendements.json")
+            self.dispatch("computeAmendements", amendements["amendements"])
 
         #Intervention treatment
         if "intervention_directory" in step:
@@ -171,13 +204,10 @@ class  DossierWalker(object):
                 print ">No Intervention Directory "
                 return;
 
-            #interventions = open_json(amdtDir, "amendements.json")
             seance_files = step["intervention_files"]
             for seance_file in seance_files:
-                seance = open_json(intervDir, "%s.json"%seance_file)
-
-                for interv in seance["seance"]:
-                    self.computationClass.computeInterventions(interv)
+                seance = self.load(intervDir, "%s.json"%seance_file)
+                self.dispatch("computeInterventions", seance["seance"])
         
         #Text Treatment
         if "working_text_directory" in step:
@@ -187,25 +217,29 @@ class  DossierWalker(object):
                 print "ERROR > no Text directory"
                 return;
 
-            text = open_json(textDir, "texte.json")
-            
-            self.computationClass.computeText(text)
+            text = self.load(textDir, "texte.json")
+            self.dispatch("computeText", [text])
 
-        #Article Etape 
-        articleEtape = open_json(self.vizPath, "articles_etapes.json")
-        self.computationClass.computeArticleEtapes(articleEtape)
+        #Article Etape, parsed once but handed over at each step as before
+        articleEtape = self.load(self.vizPath, "articles_etapes.json")
+        self.dispatch("computeArticleEtapes", [articleEtape])
         
 
 ####################################################
 
     def walk(self):
-        procedure = open_json(self.procedurePath, "procedure.json")
+        procedure = self.load(self.procedurePath, "procedure.json")
 
         for step in procedure['steps'] :
            self.step_walker(step)
-           self.computationClass.computeStep(step)
-
-        self.computationClass.finalize()
+           self.dispatch("computeStep", [step])
+
+        for i, computation in enumerate(self.computations):
+            if hasattr(computation, "finalize"):
+                start = time.time()
+                computation.finalize()
+                self.computeTimes[i] += time.time() - start
+        self.files = {}
 
 
 
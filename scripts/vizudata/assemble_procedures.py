@@ -1,22 +1,47 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+"""Run with python assemble_procedures.py ROOT_DIR [PAGESIZE] [--jobs=N] [--full]
+to write the pages of promulgated dossiers, with --jobs the dossiers are
+computed over N processes
+
+The summary of each dossier is kept in data/.assemble_procedures.json along
+with its row of dossiers_promulgues.csv and the mtime and size of the files
+it was computed from, so that only the dossiers whose inputs changed are
+computed again and only the pages whose content changed are rewritten. The
+pages left by former runs are removed.
+Editing these scripts or giving --full computes everything again."""
+
 import os, sys
+from multiprocessing import Pool
 from common import *
 from aggregates_data import DossierWalker,CountAmendementComputation
 from difflib import ndiff, SequenceMatcher
 
-sourcedir = os.path.join(sys.argv[1], 'data')
-if not sourcedir:
+args = [a for a in sys.argv[1:] if not a.startswith('--')]
+jobs = 1
+full = False
+for opt in sys.argv[1:]:
+    if opt == '--full':
+        full = True
+    elif opt.startswith('--jobs='):
+        try:
+            jobs = int(opt.split('=', 1)[1])
+        except:
+            sys.stderr.write('ERROR: jobs given as option should be an integer: %s\n' % opt)
+            exit(1)
+
+if not args:
     sys.stderr.write('ERROR: no input directory given\n')
     exit(1)
+sourcedir = os.path.join(args[0], 'data')
 
 pagesize = 50
-if len(sys.argv) > 2:
+if len(args) > 1:
     try:
-        pagesize = int(sys.argv[2])
+        pagesize = int(args[1])
     except:
-        sys.stderr.write('ERROR: pagesize given as input should be an integer: %s\n' % sys.argv[2])
+        sys.stderr.write('ERROR: pagesize given as input should be an integer: %s\n' % args[1])
         exit(1)
 
 dossiers = open_csv(sourcedir, 'dossiers_promulgues.csv')
@@ -38,6 +63,7 @@ dossiers.sort(key=lambda k: format_date(k['Date de promulgation']), reverse=True
 
 namefile = lambda npage: "dossiers_%s_%s.json" % (pagesize*npage, min(total, pagesize*(npage+1))-1)
 def save_json_page(tosave, done):
+    """Write a page unless it already holds the same content, return whether it was written."""
     npage = (done - 1) / pagesize
     data = {"total": total,
             "min_date": mindate,
@@ -49,13 +75,20 @@ def save_json_page(tosave, done):
             "dossiers": tosave}
     if done < total:
         data["next_page"] = namefile(npage+1)
-    print_json(data, os.path.join(sourcedir, namefile(npage)))
-
-done = 0
-tosave = []
-
-def read_text(text_id, step_id):
-    articles = open_json(os.path.join(sourcedir, text_id.encode('utf-8'), 'procedure', step_id.encode('utf-8'), 'texte'), 'texte.json')['articles']
+    path = os.path.join(sourcedir, namefile(npage))
+    try:
+        with open(path) as f:
+            if json.load(f) == json.loads(json.dumps(data)):
+                return False
+    except (IOError, ValueError):
+        pass
+    print_json(data, path)
+    return True
+
+def read_text(text_id, step_id, inputs):
+    textdir = os.path.join(sourcedir, text_id.encode('utf-8'), 'procedure', step_id.encode('utf-8'), 'texte')
+    inputs.add(os.path.join(textdir, 'texte.json'))
+    articles = open_json(textdir, 'texte.json')['articles']
     texte = []
     for art in articles:
         for key in sorted(art['alineas'].keys()):
@@ -63,11 +96,13 @@ def read_text(text_id, step_id):
                 texte.append(art['alineas'][key])
     return texte
 
-for d in dossiers:
-
+def assemble_procedure(d):
+    """Return the summary of dossier d and the paths of the files it was made from."""
     computation = CountAmendementComputation()
     myWalker = DossierWalker(d["id"],computation)
     myWalker.walk()
+    inputs = set(myWalker.paths)
+    inputs.add(os.path.join(sourcedir, d['id'], 'viz', 'procedure.json'))
 
     proc = open_json(os.path.join(sourcedir, d['id'], 'viz'), 'procedure.json')
     proc["id"] = d["id"]
@@ -96,25 +131,96 @@ for d in dossiers:
             continue
         if s['step'] != "depot":
             first_found = True
-            lastText = read_text(d['id'], s['directory'])
+            lastText = read_text(d['id'], s['directory'], inputs)
         if not first_found and s['step'] == "depot":
-            firstText = read_text(d['id'], s['directory'])
+            firstText = read_text(d['id'], s['directory'], inputs)
     a = SequenceMatcher(None, "\n".join(firstText), "\n".join(lastText)).get_matching_blocks()
     proc["ratio_texte_modif"] = 1 - float(sum([m[2] for m in a])) / max(a[-1][0], a[-1][1])
     proc["input_text_length2"] = len("\n".join(firstText))
     proc["output_text_length2"] = len("\n".join(lastText))
-
+    return proc, inputs
 
 # TODO:
 # - take dates + décision CC from csv
 # - take état du dossier from csv when more than promulgués (and handle better end date then)
 
-    tosave.append(proc)
+def assemble_procedure_job(d):
+    # open_json exits on errors, which would leave a pool waiting forever
+    try:
+        return assemble_procedure(d)
+    except SystemExit:
+        return None
+
+def stat_files(paths):
+    """Map each path, relative to the data directory, to its [mtime, size]."""
+    stats = {}
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        stats[os.path.relpath(os.path.abspath(path), sourcedir)] = [st.st_mtime, st.st_size]
+    return stats
+
+def unchanged(entry, d):
+    if entry is None or entry["row"] != d:
+        return False
+    return stat_files([os.path.join(sourcedir, p) for p in entry["files"]]) == entry["files"]
+
+manifest_path = os.path.join(sourcedir, '.assemble_procedures.json')
+scriptsdir = os.path.dirname(os.path.abspath(__file__))
+scripts = stat_files([os.path.join(scriptsdir, f) for f in ('assemble_procedures.py', 'aggregates_data.py', 'common.py')])
+manifest = {"scripts": scripts, "dossiers": {}}
+if not full and os.path.exists(manifest_path):
+    previous = open_json(sourcedir, '.assemble_procedures.json')
+    if previous.get("scripts") == scripts:
+        manifest["dossiers"] = previous["dossiers"]
+
+entries = {}
+todo = []
+for d in dossiers:
+    entry = manifest["dossiers"].get(d["id"])
+    if unchanged(entry, d):
+        entries[d["id"]] = entry
+    else:
+        todo.append(d)
+
+# Dossiers are independent, imap hands back their procedures in the order of
+# the list sorted by promulgation date
+if jobs > 1 and len(todo) > 1:
+    pool = Pool(jobs)
+    results = pool.imap(assemble_procedure_job, todo)
+else:
+    pool = None
+    results = (assemble_procedure(d) for d in todo)
+for d, result in zip(todo, results):
+    if result is None:
+        pool.terminate()
+        exit(1)
+    proc, inputs = result
+    entries[d["id"]] = {"row": d, "files": stat_files(inputs), "proc": proc}
+if pool:
+    pool.close()
+    pool.join()
+
+done = 0
+written = 0
+tosave = []
+for d in dossiers:
+    tosave.append(entries[d["id"]]["proc"])
     done += 1
-    if done % pagesize == 0:
-        save_json_page(tosave, done)
+    if done % pagesize == 0 or done == total:
+        written += save_json_page(tosave, done)
         tosave = []
 
-if tosave:
-    save_json_page(tosave, done)
+# Pages of former runs would be read again by the scripts following next_page
+# links from each first page, see find_pages
+pages = set(namefile(n) for n in range((total + pagesize - 1) / pagesize))
+for fil in os.listdir(sourcedir):
+    if re_dossiers_page.match(fil) and fil not in pages:
+        os.remove(os.path.join(sourcedir, fil))
+
+manifest["dossiers"] = entries
+print_json(manifest, manifest_path)
+sys.stderr.write("INFO: %d dossiers computed, %d reused, %d pages written\n" % (len(todo), total - len(todo), written))
 
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Run with python check_make_csv_stats.py to check make_csv_stats.py against
+the rows of its former version on generated pages of dossiers, as well as its
+--delimiter and --output options.
+
+The former version only quoted the values holding a comma, so that a value
+holding double quotes but no comma was written as is, making an invalid csv
+row. The csv module quotes these too, which is the only expected difference."""
+
+import os, sys, csv, gzip, json, shutil, tempfile, subprocess
+from StringIO import StringIO
+
+script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "make_csv_stats.py")
+
+# Former export, see make_csv_stats.py before it streamed the pages
+formatt = lambda x: x.encode("utf-8") if type(x) == unicode else str(x)
+cleanquotes = lambda x: '"' + x.replace('"', '""') + '"' if "," in x else x
+safediv = lambda x, y: 0 if not int(y) else int(x)/float(y)
+
+def former_rows(dossiers):
+    rows = []
+    for text in dossiers:
+        text = dict(text)
+        text["decision_cc"] = ""
+        for s in text["steps"]:
+            if "decision" in s:
+                text["decision_cc"] = s["decision"]
+                break
+        text["themes"] = "|".join(text["themes"])
+        text["ratio_text_size"] = safediv(int(text["output_text_length2"])-int(text["input_text_length2"]), text["input_text_length2"])
+        text["taux_amendements_adoptes"] = safediv(text["total_amendements_adoptes"], text["total_amendements"])
+        text["taux_amendements_parlementaire_adoptes"] = safediv(text["total_amendements_parlementaire_adoptes"], text["total_amendements_parlementaire"])
+        rows.append([formatt(text.get(h, 0)) for h in HEADERS])
+    return rows
+
+HEADERS = ["id", "short_title", "procedure", "type", "beginning", "end", "decision_cc", "themes",
+           "input_text_length2", "output_text_length2", "ratio_text_size", "ratio_texte_modif",
+           "total_articles", "total_articles_modified", "ratio_article_modif", "total_days",
+           "total_accident_procedure", "total_intervenant", "total_mots2", "total_amendements",
+           "total_amendements_adoptes", "taux_amendements_adoptes", "total_amendements_parlementaire",
+           "total_amendements_parlementaire_adoptes", "taux_amendements_parlementaire_adoptes"]
+
+titles = [u"loi relative à la santé", u"loi portant diverses dispositions, d'ordre social",
+          u'loi dite "Macron"', u'loi "travail", dite El Khomri', u"loi n°2 sur l'été"]
+
+def dossier(i):
+    return {"id": "pjl%d-%03d" % (12 + i % 5, i), "short_title": titles[i % len(titles)],
+            "procedure": "normale" if i % 3 else u"accélérée", "type": "projet" if i % 2 else "proposition",
+            "beginning": "2013-01-%02d" % (1 + i % 28), "end": "2014-02-%02d" % (1 + i % 28),
+            "steps": [{"step": "depot"}] + ([{"step": u"constitutionnalité", "decision": u"partiellement conforme"}] if i % 4 == 0 else []),
+            "themes": [u"économie", u"travail"][:1 + i % 2], "input_text_length2": 1000 + i, "output_text_length2": 2000 + 3 * i,
+            "ratio_texte_modif": i / 7., "total_articles": i, "total_articles_modified": i / 2, "ratio_article_modif": .5,
+            "total_days": 100 + i, "total_accident_procedure": i % 2, "total_intervenant": 30 + i, "total_mots2": 1000 * i,
+            "total_amendements": 10 * i, "total_amendements_adoptes": i, "total_amendements_parlementaire": 5 * i,
+            "total_amendements_parlementaire_adoptes": i / 3}
+
+def write_pages(datadir, dossiers, pagesize):
+    total = len(dossiers)
+    name = lambda n: "dossiers_%s_%s.json" % (n, min(total, n + pagesize) - 1)
+    for n in range(0, total, pagesize):
+        page = {"total": total, "count": len(dossiers[n:n+pagesize]), "page": n / pagesize,
+                "next_page": name(n + pagesize) if n + pagesize < total else None, "dossiers": dossiers[n:n+pagesize]}
+        with open(os.path.join(datadir, name(n)), "w") as f:
+            f.write(json.dumps(page, ensure_ascii=False).encode("utf-8"))
+
+def run(root, *opts):
+    return subprocess.check_output([sys.executable, script, root] + list(opts))
+
+def parse(text, delimiter=","):
+    return list(csv.reader(StringIO(text), delimiter=delimiter))
+
+
+if __name__ == "__main__":
+
+    root = tempfile.mkdtemp()
+    try:
+        datadir = os.path.join(root, "data")
+        os.makedirs(datadir)
+        dossiers = [dossier(i) for i in range(23)]
+        write_pages(datadir, dossiers, 10)
+        expected = former_rows(dossiers)
+
+        print "[TEST] Rows identical to the former export but for double quotes without comma:"
+        out = run(root)
+        lines = out.split("\n")
+        assert(lines[0] == ",".join(HEADERS))
+        assert(lines[-1] == "" and len(lines) == len(expected) + 2)
+        quoted = 0
+        for line, row in zip(lines[1:], expected):
+            former = ",".join(cleanquotes(v) for v in row)
+            if any('"' in v and "," not in v for v in row):
+                assert(line != former)
+                quoted += 1
+            else:
+                assert(line == former)
+        assert(quoted)
+        assert(parse(out)[1:] == expected)
+        print " -> Success!"
+
+        print "[TEST] Values holding double quotes without comma are now quoted:"
+        line = lines[1 + [titles[i % len(titles)] for i in range(23)].index(u'loi dite "Macron"')]
+        assert(',"loi dite ""Macron""",' in line)
+        print " -> Success!"
+
+        print "[TEST] Pages of a former run are not exported again:"
+        former = os.path.join(root, "former")
+        os.makedirs(former)
+        write_pages(former, [dossier(i) for i in range(25)], 10)
+        shutil.copy(os.path.join(former, "dossiers_20_24.json"), datadir)
+        assert(run(root) == out)
+        print " -> Success!"
+
+        print "[TEST] Several complete runs of pages are an error:"
+        write_pages(former, [dossier(i) for i in range(5)], 5)
+        shutil.copy(os.path.join(former, "dossiers_0_4.json"), datadir)
+        with open(os.devnull, "w") as devnull:
+            assert(subprocess.call([sys.executable, script, root], stdout=devnull, stderr=devnull) == 1)
+        os.remove(os.path.join(datadir, "dossiers_0_4.json"))
+        print " -> Success!"
+
+        print "[TEST] Option --delimiter=;"
+        semi = run(root, "--delimiter=;")
+        assert(semi.split("\n")[0] == ";".join(HEADERS))
+        assert(parse(semi, ";") == parse(out))
+        print " -> Success!"
+
+        print "[TEST] Option --output as csv then gzip compressed csv:"
+        path = os.path.join(root, "stats.csv")
+        assert(run(root, "--output=%s" % path) == "")
+        with open(path) as f:
+            assert(f.read() == out)
+        assert(run(root, "--output=%s.gz" % path, "--delimiter=;") == "")
+        with gzip.open("%s.gz" % path) as f:
+            assert(f.read() == semi)
+        print " -> Success!"
+    finally:
+        shutil.rmtree(root)
@@ -1,8 +1,10 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import sys, os, re, requests
+import sys, os, re, time, sqlite3, requests
 from datetime import date
+from multiprocessing.pool import ThreadPool
+from requests.adapters import HTTPAdapter
 from htmlentitydefs import name2codepoint
 from csv import DictReader
 try:
@@ -46,6 +48,99 @@ def print_json(dico, filename=None):
     else:
         print json.dumps(dico, ensure_ascii=False).encode('utf8')
 
+re_json_ws = re.compile(r'[ \t\n\r]*')
+def iter_json_array(f, key=None, decoder=None, bufsize=65536):
+    """Yield one at a time the elements of the json array making file f, or
+    found under key in the object making it, reading only as much of the file
+    as each element needs. Yields nothing when key is missing."""
+    decoder = decoder or json.JSONDecoder()
+    state = {"buf": "", "pos": 0, "eof": False}
+    def fill():
+        if state["eof"]:
+            return False
+        chunk = f.read(max(bufsize, len(state["buf"]) - state["pos"]))
+        state["buf"] = state["buf"][state["pos"]:] + chunk
+        state["pos"] = 0
+        state["eof"] = not chunk
+        return bool(chunk)
+    def peek():
+        while True:
+            state["pos"] = re_json_ws.match(state["buf"], state["pos"]).end()
+            if state["pos"] < len(state["buf"]):
+                return state["buf"][state["pos"]]
+            if not fill():
+                raise ValueError("Unexpected end of json data")
+    def expect(chars):
+        c = peek()
+        if c not in chars:
+            raise ValueError("Expected one of %s in json data, got %s" % (chars, c))
+        state["pos"] += 1
+        return c
+    def value():
+        peek()
+        while True:
+            try:
+                obj, end = decoder.raw_decode(state["buf"], state["pos"])
+                # A number cut by the end of the buffer would still decode
+                if state["eof"] or (end < len(state["buf"]) and state["buf"][end] not in ".eE+-"):
+                    state["pos"] = end
+                    return obj
+            except ValueError:
+                if state["eof"]:
+                    raise
+            fill()
+    if key is not None:
+        expect("{")
+        if peek() == "}":
+            return
+        while value() != key:
+            expect(":")
+            value()
+            if expect(",}") == "}":
+                return
+        expect(":")
+    expect("[")
+    if peek() == "]":
+        return
+    while True:
+        yield value()
+        if expect(",]") == "]":
+            return
+
+re_dossiers_page = re.compile(r'^dossiers_(\d+)_(\d+)\.json$')
+def find_pages(datadir):
+    """Return in order the pages of dossiers written by assemble_procedures.py,
+    following the next_page links from the first page of the only chain of
+    pages agreeing on their total and holding that many dossiers. Pages are
+    only rewritten when their content changes so their mtimes tell nothing of
+    the run they come from, assemble_procedures.py removes the pages of former
+    runs but several complete chains may remain from older versions of it."""
+    chains = []
+    for first in sorted(os.listdir(datadir)):
+        m = re_dossiers_page.match(first)
+        if not m or m.group(1) != "0":
+            continue
+        pages = []
+        page, done, total = first, 0, None
+        while page:
+            m = re_dossiers_page.match(page)
+            if page in pages or not m or not os.path.exists(os.path.join(datadir, page)):
+                break
+            data = open_json(datadir, page)
+            if total is None:
+                total = data["total"]
+            if data["total"] != total or int(m.group(1)) != done or int(m.group(2)) != done + len(data["dossiers"]) - 1:
+                break
+            pages.append(page)
+            done += len(data["dossiers"])
+            page = data["next_page"]
+        if not page and done == total:
+            chains.append(pages)
+    if len(chains) > 1:
+        sys.stderr.write("ERROR: several runs of dossiers pages found in %s (%s), run assemble_procedures.py again to remove the former ones\n" % (datadir, ", ".join(c[0] for c in chains)))
+        exit(1)
+    return chains[0] if chains else []
+
 datize = lambda d: date(*tuple([int(a) for a in d.split('-')]))
 def format_date(d):
     da = d.split('/')
@@ -87,6 +182,138 @@ def slug_groupe(g):
     g = g.replace("ECO", "ECOLO")
     return g
 
+# Groupes and parlementaires files written by generate_data.py in the data
+# directory, the latter were once named with a dash like the former
+re_parls_file = re.compile(r'^(.*?)[-.](groupes|parlementaires)\.json$')
+
+class ParlIndex(object):
+    """sqlite index of the groupes and parlementaires files of a data
+    directory, kept in it and shared by all the vizudata scripts. Files are
+    indexed again only when their mtime or size changed. Parlementaires
+    missing from the files are fetched from the web through one pooled
+    session and kept, those not found are not asked again for MISSING_TTL."""
+
+    MISSING_TTL = 24 * 3600
+
+    def __init__(self, datadir, jobs=8):
+        self.datadir = datadir
+        self.jobs = jobs
+        self.session = None
+        self.parls = {}
+        self.db = sqlite3.connect(os.path.join(datadir, '.parlementaires.sqlite'), timeout=60)
+        with self.db:
+            self.db.execute('CREATE TABLE IF NOT EXISTS files (name TEXT PRIMARY KEY, urlapi TEXT, kind TEXT, mtime REAL, size INTEGER)')
+            self.db.execute('CREATE TABLE IF NOT EXISTS groupes (urlapi TEXT, acronyme TEXT, nom TEXT, ord INTEGER, color TEXT, PRIMARY KEY (urlapi, acronyme))')
+            self.db.execute('CREATE TABLE IF NOT EXISTS parlementaires (urlapi TEXT, slug TEXT, data TEXT, PRIMARY KEY (urlapi, slug))')
+            self.db.execute('CREATE TABLE IF NOT EXISTS missing (urlapi TEXT, slug TEXT, checked REAL, PRIMARY KEY (urlapi, slug))')
+
+    def refresh(self, kinds=("groupes", "parlementaires")):
+        """Index the files of the given kinds added or changed since last time
+        and forget those removed."""
+        known = dict((name, (mtime, size)) for name, mtime, size in self.db.execute('SELECT name, mtime, size FROM files'))
+        present = set()
+        for f in os.listdir(self.datadir):
+            m = re_parls_file.match(f)
+            if not m or m.group(2) not in kinds:
+                continue
+            present.add(f)
+            st = os.stat(os.path.join(self.datadir, f))
+            if known.get(f) != (st.st_mtime, st.st_size):
+                self.index_file(f, m.group(1).lower(), m.group(2), st)
+        for f in known:
+            m = re_parls_file.match(f)
+            if f not in present and m and m.group(2) in kinds:
+                with self.db:
+                    self.db.execute('DELETE FROM %s WHERE urlapi = ?' % m.group(2), (m.group(1).lower(),))
+                    self.db.execute('DELETE FROM files WHERE name = ?', (f,))
+        self.parls = {}
+
+    def index_file(self, f, url, kind, st):
+        try:
+            with open(os.path.join(self.datadir, f), "r") as data:
+                if kind == "groupes":
+                    rows = []
+                    for gpe in json.load(data)['organismes']:
+                        if not gpe["organisme"]["acronyme"]:
+                            continue
+                        rows.append((url, slug_groupe(gpe["organisme"]["acronyme"]), gpe["organisme"]['nom'],
+                                     int(gpe["organisme"]['order']), "rgb(%s)" % gpe["organisme"]['couleur']))
+                else:
+                    typeparl = "depute" if "depute" in url else "senateur"
+                    rows = [(url, parl[typeparl]["slug"], json.dumps(parl[typeparl])) for parl in json.load(data)[typeparl+"s"]]
+        except Exception as e:
+            sys.stderr.write('WARNING: could not read %s file %s in data\n' % (kind, f))
+            sys.stderr.write('%s: %s\n' % (type(e), e))
+            return
+        with self.db:
+            self.db.execute('DELETE FROM %s WHERE urlapi = ?' % kind, (url,))
+            if rows:
+                self.db.executemany('INSERT OR REPLACE INTO %s VALUES (%s)' % (kind, ", ".join("?" * len(rows[0]))), rows)
+            self.db.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)', (f, url, kind, st.st_mtime, st.st_size))
+
+    def groupes(self):
+        allgroupes = dict((url, {}) for (url,) in self.db.execute('SELECT urlapi FROM files WHERE kind = ?', ("groupes",)))
+        for url, acro, nom, order, color in self.db.execute('SELECT urlapi, acronyme, nom, ord, color FROM groupes'):
+            allgroupes.setdefault(url, {})[acro] = {"nom": nom, "order": order, "color": color}
+        return allgroupes
+
+    def fetch(self, urlapi, slug):
+        typeparl = "depute" if "deputes" in urlapi else "senateur"
+        try:
+            r = self.session.get(parl_link(slug, urlapi)+"/json")
+            if r.status_code == 404:
+                return slug, None
+            return slug, r.json()[typeparl]
+        except (requests.RequestException, ValueError, KeyError) as e:
+            sys.stderr.write('WARNING: could not retrieve parlementaire %s from %s: %s\n' % (slug, urlapi, e))
+            return slug, False
+
+    def prefetch(self, urlapi, slugs):
+        """Load the given parlementaires, fetching concurrently those unknown."""
+        todo = list(set(s for s in slugs if (urlapi, s) not in self.parls))
+        for i in range(0, len(todo), 500):
+            chunk = todo[i:i+500]
+            query = 'SELECT slug, data FROM parlementaires WHERE urlapi = ? AND slug IN (%s)' % ", ".join("?" * len(chunk))
+            for slug, data in self.db.execute(query, [urlapi] + chunk):
+                self.parls[(urlapi, slug)] = json.loads(data)
+            query = 'SELECT slug FROM missing WHERE urlapi = ? AND checked > ? AND slug IN (%s)' % ", ".join("?" * len(chunk))
+            for (slug,) in self.db.execute(query, [urlapi, time.time() - self.MISSING_TTL] + chunk):
+                self.parls[(urlapi, slug)] = None
+        todo = [s for s in todo if (urlapi, s) not in self.parls]
+        if not todo:
+            return
+        if self.session is None:
+            self.session = requests.Session()
+            self.session.mount("http://", HTTPAdapter(pool_maxsize=self.jobs))
+            self.session.mount("https://", HTTPAdapter(pool_maxsize=self.jobs))
+        if len(todo) > 1 and self.jobs > 1:
+            pool = ThreadPool(min(self.jobs, len(todo)))
+            results = pool.map(lambda slug: self.fetch(urlapi, slug), todo)
+            pool.close()
+        else:
+            results = [self.fetch(urlapi, slug) for slug in todo]
+        with self.db:
+            for slug, p in results:
+                if p:
+                    self.db.execute('INSERT OR REPLACE INTO parlementaires VALUES (?, ?, ?)', (urlapi, slug, json.dumps(p)))
+                    self.parls[(urlapi, slug)] = p
+                elif p is None:
+                    self.db.execute('INSERT OR REPLACE INTO missing VALUES (?, ?, ?)', (urlapi, slug, time.time()))
+                    self.parls[(urlapi, slug)] = None
+
+    def get(self, urlapi, slug):
+        if (urlapi, slug) not in self.parls:
+            self.prefetch(urlapi, [slug])
+        p = self.parls.get((urlapi, slug))
+        if p is None:
+            raise KeyError("Unknown parlementaire %s for %s" % (slug, urlapi))
+        return p
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+        self.db.close()
+
 class Context(object):
 
     def __init__(self, sysargs, load_parls=False):
@@ -95,9 +322,9 @@ class Context(object):
         if not self.sourcedir:
             sys.stderr.write('ERROR: no input directory given\n')
             exit(1)
+        self.index = ParlIndex(os.path.join(self.sourcedir, '..'))
         self.allgroupes = {}
         self.get_groupes()
-        self.parlementaires = {}
         if load_parls:
             self.get_parlementaires()
 
@@ -110,44 +337,17 @@ class Context(object):
             exit(1)
 
     def get_parlementaires(self):
-        for f in os.listdir(os.path.join(self.sourcedir, '..')):
-            if f.endswith('-parlementaires.json'):
-                url = f.replace('-parlementaires.json', '').lower()
-                try:
-                    with open(os.path.join(self.sourcedir, '..', f), "r") as parls:
-                        self.parlementaires[url] = {}
-                        typeparl = "depute" if "depute" in url else "senateur"
-                        for parl in json.load(parls)[typeparl+"s"]:
-                            p = parl[typeparl]
-                            self.parlementaires[url][p["slug"]] = p
-                except Exception as e:
-                    sys.stderr.write('WARNING: could not read parlementaires file %s in data\n' % f)
-                    sys.stderr.write('%s: %s\n' % (type(e), e))
+        self.index.refresh(("parlementaires",))
 
     def get_parlementaire(self, urlapi, slug):
-        if self.parlementaires:
-            return self.parlementaires[urlapi][slug]
-        typeparl = "depute" if "deputes" in urlapi else "senateur"
-        return requests.get(parl_link(slug, urlapi)+"/json").json()[typeparl]
+        return self.index.get(urlapi, slug)
+
+    def prefetch_parlementaires(self, urlapi, slugs):
+        self.index.prefetch(urlapi, slugs)
 
     def get_groupes(self):
-        for f in os.listdir(os.path.join(self.sourcedir, '..')):
-            if f.endswith('-groupes.json'):
-                url = f.replace('-groupes.json', '').lower()
-                try:
-                    with open(os.path.join(self.sourcedir, '..', f), "r") as gpes:
-                        self.allgroupes[url] = {}
-                        for gpe in json.load(gpes)['organismes']:
-                            if not gpe["organisme"]["acronyme"]:
-                                continue
-                            acro = slug_groupe(gpe["organisme"]["acronyme"])
-                            self.allgroupes[url][acro] = {
-                                "nom": gpe["organisme"]['nom'],
-                                "order": int(gpe["organisme"]['order']),
-                                "color": "rgb(%s)" % gpe["organisme"]['couleur']}
-                except Exception as e:
-                    sys.stderr.write('WARNING: could not read groupes file %s in data\n' % f)
-                    sys.stderr.write('%s: %s\n' % (type(e), e))
+        self.index.refresh(("groupes",))
+        self.allgroupes = self.index.groupes()
 
     def add_groupe(self, groupes, gpe, urlapi):
         gpid = upper_first(gpe.lower())
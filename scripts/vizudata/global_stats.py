@@ -1,109 +1,57 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+"""Run with python global_stats.py from the directory holding data/ to print
+the global statistics over the promulgated dossiers and write them by dossier
+in dossier_stats.csv, see metricstore.py for the store they are computed from
+
+Dependencies :
+numpy"""
+
 import sys, os
+import numpy as np
 from common import open_json, print_json
+from metricstore import MetricStore
 
 
 class Stats(object):
 
-    def __init__(self):
-        self.countDossiers = 0
-        self.countDossiersAmende = 0
-
-
-        self.totalAmendement = 0
-        self.totalAmendementParl = 0
-        self.totalAmendementAdoptes = 0
-        self.totalAmendementParlAdoptes = 0
-
-        self.totalIntervenant = 0
-
-        self.totalArticles = 0
-        self.totalArticlesModified = 0
-
-        self.totalAccidentProcedure = 0
-        self.nbDossiersAccidentProcedure = 0
-
-        self.totalDays = 0
-
-        self.textSizeOrig = 0
-        self.textSizeFinal = 0
-        self.countTextWithDoubledVolume = 0
-        self.countTextWithDoubledVolume2 = 0
-        self.countTextReduced = 0
-        self.countTextReduced2 = 0
-
-        self.countModifSup50 = 0
-        self.countInflaSup50 = 0
-        self.countInflaSup100 = 0
-
-        self.textValues = {}
-
-
+    def __init__(self, store):
+        self.store = store
+        self.countDossiers = len(store)
 
-    def computeStatOverFile(self,file):
-        dossiers = open_json("data", file)
-        for dossier in dossiers["dossiers"]:
-            self.countDossiers += 1
+        amdts = store["total_amendements"]
+        self.totalAmendement = amdts.sum()
+        self.totalAmendementParl = store["total_amendements_parlementaire"].sum()
+        self.totalAmendementAdoptes = store["total_amendements_adoptes"].sum()
+        self.totalAmendementParlAdoptes = store["total_amendements_parlementaire_adoptes"].sum()
 
-            self.totalDays += dossier["total_days"]
+        self.totalIntervenant = store["total_intervenant"].sum()
 
-            self.totalAmendement += dossier["total_amendements"]
-            self.totalAmendementParl += dossier["total_amendements_parlementaire"]
-            self.totalAmendementAdoptes += dossier["total_amendements_adoptes"]
-            self.totalAmendementParlAdoptes += dossier["total_amendements_parlementaire_adoptes"]
+        self.totalArticles = store["total_articles"].sum()
+        self.totalArticlesModified = store["total_articles_modified"].sum()
 
-            self.totalIntervenant += dossier["total_intervenant"]
+        self.totalAccidentProcedure = store["total_accident_procedure"].sum()
+        self.nbDossiersAccidentProcedure = np.count_nonzero(store["total_accident_procedure"] > 0)
 
-            self.totalArticles += dossier["total_articles"]
-            self.totalArticlesModified += dossier["total_articles_modified"]
+        self.totalDays = store["total_days"].sum()
 
-            self.totalAccidentProcedure += dossier["total_accident_procedure"]
-            if dossier["total_accident_procedure"] > 0:
-                self.nbDossiersAccidentProcedure +=1
-
-            ##
-            self.textSizeOrig += dossier["input_text_length2"]
-            self.textSizeFinal += dossier["output_text_length2"]
-            #if (float(dossier["output_text_length"])/dossier["input_text_length"]) > 2.0:
-            #    self.countTextWithDoubledVolume +=1
-            if dossier["output_text_length"] < dossier["input_text_length"]:
-                self.countTextReduced +=1
-
-            if (float(dossier["output_text_length2"])/dossier["input_text_length2"]) > 2.0:
-                self.countTextWithDoubledVolume2 +=1
-            if dossier["output_text_length2"] < dossier["input_text_length2"]:
-                self.countTextReduced2 +=1
-
-            if dossier["total_amendements"] >0:
-                self.countDossiersAmende += 1
-
-                if dossier["ratio_texte_modif"] >= 0.5:
-                    self.countModifSup50 += 1
-                if (dossier["output_text_length2"]-dossier["input_text_length2"])/float(dossier["input_text_length2"]) > 0.5 :
-                    self.countInflaSup50 += 1
-                if (dossier["output_text_length2"]-dossier["input_text_length2"])/float(dossier["input_text_length2"]) > 1 :
-                    self.countInflaSup100 += 1
-
-
-
-            ##############################################
-            self.textValues[dossier["id"]] = {}
-            self.textValues[dossier["id"]]["short_title"] = dossier["short_title"]
-            self.textValues[dossier["id"]]["input_text_length"] = dossier["input_text_length2"]
-            self.textValues[dossier["id"]]["output_text_length"] = dossier["output_text_length2"]
-            self.textValues[dossier["id"]]["inflation"] = (dossier["output_text_length2"]-dossier["input_text_length2"])/float(dossier["input_text_length2"])
-            self.textValues[dossier["id"]]["modification"] = dossier["ratio_texte_modif"]
-
-            self.textValues[dossier["id"]]["amendement"] = dossier["total_amendements"]
-            self.textValues[dossier["id"]]["amendementAdoptes"] = dossier["total_amendements_adoptes"]
-            self.textValues[dossier["id"]]["tauxAdoption"] = dossier["total_amendements_adoptes"]/(float(dossier["total_amendements"] if dossier["total_amendements"] != 0 else 1))
-
-            self.textValues[dossier["id"]]["daysBeforeAdoption"] = dossier["total_days"]
-            self.textValues[dossier["id"]]["ProcedureAccident"] = dossier["total_accident_procedure"]
-            self.textValues[dossier["id"]]["NbIntervenants"] = dossier["total_intervenant"]
+        inputLength = store["input_text_length2"]
+        outputLength = store["output_text_length2"]
+        self.textSizeOrig = inputLength.sum()
+        self.textSizeFinal = outputLength.sum()
+        self.countTextReduced = np.count_nonzero(store["output_text_length"] < store["input_text_length"])
+        self.countTextReduced2 = np.count_nonzero(outputLength < inputLength)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.inflation = (outputLength - inputLength) / inputLength.astype(np.float64)
+            self.countTextWithDoubledVolume2 = np.count_nonzero(outputLength / inputLength.astype(np.float64) > 2.0)
+            self.tauxAdoption = store["total_amendements_adoptes"] / np.where(amdts != 0, amdts, 1).astype(np.float64)
 
+        amende = amdts > 0
+        self.countDossiersAmende = np.count_nonzero(amende)
+        self.countModifSup50 = np.count_nonzero(amende & (store["ratio_texte_modif"] >= 0.5))
+        self.countInflaSup50 = np.count_nonzero(amende & (self.inflation > 0.5))
+        self.countInflaSup100 = np.count_nonzero(amende & (self.inflation > 1))
 
     def printStats(self):
         print "Total Amendement traites : %d" % (self.totalAmendement)
@@ -148,47 +96,19 @@ class Stats(object):
         #print self.textValues
 
     def writeCSV(self):
-        f = open("dossier_stats.csv", "w")
-        f.write("Text Id;Short title;Input Text Length;Output Text Length;Inflation of text;Modification of text")
-        f.write(";Number of Amendement;Adopted Amendement;Adoption Ratio")
-        f.write(";Days of procedure;Intervenants;Procedure Accident")
-        f.write("\n")
-
-        for text in self.textValues :
-            title = self.textValues[text]["short_title"]
-            inputLength = self.textValues[text]["input_text_length"]
-            outputLength = self.textValues[text]["output_text_length"]
-            infla = self.textValues[text]["inflation"]
-            modif = self.textValues[text]["modification"]
-            amendement = self.textValues[text]["amendement"]
-            amendementAdoptes = self.textValues[text]["amendementAdoptes"]
-            tauxAdoption = self.textValues[text]["tauxAdoption"]
-
-            daysBeforeAdoption = self.textValues[text]["daysBeforeAdoption"]
-            intervenants = self.textValues[text]["NbIntervenants"]
-            procedureAccident = self.textValues[text]["ProcedureAccident"]
-
-            s = u"\"%s\";\"%s\"" %(text,title)
-            f.write(s.encode("utf-8"))
-            s = u";%d;%d;%f;%f" % (inputLength, outputLength,infla, modif)
-            f.write(s.encode("utf-8"))
-            s = u";%d;%d;%f" % (amendement, amendementAdoptes, tauxAdoption)
-            f.write(s.encode("utf-8"))
-            s = u";%d;%d;%d" % (daysBeforeAdoption, intervenants, procedureAccident)
-            f.write(s.encode("utf-8"))
+        store = self.store
+        columns = zip(store["id"], store["short_title"],
+                      store["input_text_length2"], store["output_text_length2"], self.inflation, store["ratio_texte_modif"],
+                      store["total_amendements"], store["total_amendements_adoptes"], self.tauxAdoption,
+                      store["total_days"], store["total_intervenant"], store["total_accident_procedure"])
+        with open("dossier_stats.csv", "w") as f:
+            f.write("Text Id;Short title;Input Text Length;Output Text Length;Inflation of text;Modification of text")
+            f.write(";Number of Amendement;Adopted Amendement;Adoption Ratio")
+            f.write(";Days of procedure;Intervenants;Procedure Accident")
             f.write("\n")
-        f.close()
-
-
-
+            f.write("".join((u"\"%s\";\"%s\";%d;%d;%f;%f;%d;%d;%f;%d;%d;%d\n" % row).encode("utf-8") for row in columns))
 
-stats = Stats()
-stats.computeStatOverFile("dossiers_0_49.json")
-stats.computeStatOverFile("dossiers_50_99.json")
-stats.computeStatOverFile("dossiers_100_149.json")
-stats.computeStatOverFile("dossiers_150_199.json")
-stats.computeStatOverFile("dossiers_200_249.json")
-stats.computeStatOverFile("dossiers_250_294.json")
 
+stats = Stats(MetricStore.load_or_build("data", os.path.join("data", "dossiers_stats.npz")))
 stats.printStats()
 stats.writeCSV()
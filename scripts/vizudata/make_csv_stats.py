@@ -1,15 +1,33 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import os, sys, json
+"""Run with python make_csv_stats.py ROOT_DIR [--delimiter=,] [--output=FILE]
+to export as csv the summaries of the promulgated dossiers, following the
+pages of the last run of assemble_procedures.py one dossier at a time, on the
+standard output or into FILE, gzip compressed when it ends with .gz
 
-sourcedir = os.path.join(sys.argv[1], 'data')
-if not sourcedir:
+See check_make_csv_stats.py for a check of its rows against the former export."""
+
+import os, sys, csv, gzip
+from common import iter_json_array, find_pages
+
+args = [a for a in sys.argv[1:] if not a.startswith('--')]
+delimiter = ","
+output = None
+for opt in sys.argv[1:]:
+    if opt.startswith('--delimiter='):
+        delimiter = opt.split('=', 1)[1]
+    elif opt.startswith('--output='):
+        output = opt.split('=', 1)[1]
+if len(delimiter) != 1:
+    sys.stderr.write('ERROR: delimiter should be a single character: %s\n' % delimiter)
+    exit(1)
+if not args:
     sys.stderr.write('ERROR: no input directory given\n')
     exit(1)
+sourcedir = os.path.join(args[0], 'data')
 
 formatt = lambda x: x.encode("utf-8") if type(x) == unicode else str(x)
-cleanquotes = lambda x: '"' + x.replace('"', '""') + '"' if "," in x else x
 safediv = lambda x, y: 0 if not int(y) else int(x)/float(y)
 
 headers = [
@@ -39,23 +57,35 @@ headers = [
   "total_amendements_parlementaire_adoptes",
   "taux_amendements_parlementaire_adoptes"
 ]
-print ",".join(headers)
-
-for fil in os.listdir(sourcedir):
-    if not fil.startswith("dossiers_") or not fil.endswith(".json"):
-        continue
-    with open(os.path.join(sourcedir, fil)) as f:
-        dset = json.load(f)["dossiers"]
-    for text in dset:
-        text["decision_cc"] = ""
-        for s in text["steps"]:
-            if "decision" in s:
-                text["decision_cc"] = s["decision"]
-                break
-        text["themes"] = "|".join(text["themes"])
-        text["ratio_text_size"] = safediv(int(text["output_text_length2"])-int(text["input_text_length2"]), text["input_text_length2"])
-        text["taux_amendements_adoptes"] = safediv(text["total_amendements_adoptes"], text["total_amendements"])
-        text["taux_amendements_parlementaire_adoptes"] = safediv(text["total_amendements_parlementaire_adoptes"], text["total_amendements_parlementaire"])
-
-        print ",".join([cleanquotes(formatt(text.get(h, 0))) for h in headers])
+
+def iter_dossiers():
+    for fil in find_pages(sourcedir):
+        with open(os.path.join(sourcedir, fil)) as f:
+            for text in iter_json_array(f, "dossiers"):
+                yield text
+
+if not output:
+    out = sys.stdout
+elif output.endswith(".gz"):
+    out = gzip.open(output, "wb")
+else:
+    out = open(output, "wb")
+writer = csv.writer(out, delimiter=delimiter, lineterminator="\n")
+writer.writerow(headers)
+
+for text in iter_dossiers():
+    text["decision_cc"] = ""
+    for s in text["steps"]:
+        if "decision" in s:
+            text["decision_cc"] = s["decision"]
+            break
+    text["themes"] = "|".join(text["themes"])
+    text["ratio_text_size"] = safediv(int(text["output_text_length2"])-int(text["input_text_length2"]), text["input_text_length2"])
+    text["taux_amendements_adoptes"] = safediv(text["total_amendements_adoptes"], text["total_amendements"])
+    text["taux_amendements_parlementaire_adoptes"] = safediv(text["total_amendements_parlementaire_adoptes"], text["total_amendements_parlementaire"])
+
+    writer.writerow([formatt(text.get(h, 0)) for h in headers])
+
+if output:
+    out.close()
 
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Columnar store of the metrics of the promulgated dossiers
+
+The pages written by assemble_procedures.py are loaded once into one NumPy
+array per metric, in the order of the pages, and saved as a .npz file along
+with the names of the pages, which is reused as long as the same pages are
+found and it is newer than them.
+
+Run with python metricstore.py [DATA_DIR] [--percentile=METRIC] [--group-by=theme|year]
+to print the percentiles of a metric and its mean by theme or year of
+promulgation (total_amendements by default)
+
+Dependencies :
+numpy"""
+
+import os, sys
+from collections import OrderedDict
+import numpy as np
+from common import open_json, find_pages
+
+METRICS = ["total_days", "total_amendements", "total_amendements_adoptes",
+           "total_amendements_parlementaire", "total_amendements_parlementaire_adoptes",
+           "total_intervenant", "total_articles", "total_articles_modified",
+           "total_accident_procedure", "input_text_length", "output_text_length",
+           "input_text_length2", "output_text_length2", "ratio_texte_modif"]
+FLOAT_METRICS = ["ratio_texte_modif"]
+LABELS = ["id", "short_title", "themes", "end"]
+PAGES_KEY = "__pages__"
+
+
+class MetricStore(object):
+
+    def __init__(self, columns, pages=()):
+        self.columns = columns
+        self.pages = list(pages)
+        self.index = dict((id, i) for i, id in enumerate(columns["id"]))
+
+    def __len__(self):
+        return len(self.columns["id"])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    @classmethod
+    def from_pages(cls, datadir, pages=None):
+        pages = pages or find_pages(datadir)
+        rows = OrderedDict()
+        for page in pages:
+            for dossier in open_json(datadir, page)["dossiers"]:
+                rows[dossier["id"]] = dossier
+        dossiers = rows.values()
+        columns = {}
+        for metric in METRICS:
+            columns[metric] = np.array([d[metric] for d in dossiers], dtype=np.float64 if metric in FLOAT_METRICS else np.int64)
+        columns["id"] = np.array([d["id"] for d in dossiers], dtype=np.unicode_)
+        columns["short_title"] = np.array([d.get("short_title", u"") for d in dossiers], dtype=np.unicode_)
+        columns["themes"] = np.array([u",".join(d["themes"]) for d in dossiers], dtype=np.unicode_)
+        columns["end"] = np.array([d["end"] for d in dossiers], dtype=np.unicode_)
+        return cls(columns, pages)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            columns = dict((name, data[name]) for name in data.files if name != PAGES_KEY)
+            pages = [unicode(p) for p in data[PAGES_KEY]] if PAGES_KEY in data.files else []
+        return cls(columns, pages)
+
+    def save(self, path):
+        columns = dict(self.columns)
+        columns[PAGES_KEY] = np.array(self.pages, dtype=np.unicode_)
+        np.savez_compressed(path, **columns)
+
+    @classmethod
+    def load_or_build(cls, datadir, path):
+        """Load path unless it is missing, was built from other pages or is
+        older than one of them."""
+        pages = find_pages(datadir)
+        if os.path.exists(path) and all(os.path.getmtime(path) >= os.path.getmtime(os.path.join(datadir, p)) for p in pages):
+            store = cls.load(path)
+            if store.pages == pages:
+                return store
+        store = cls.from_pages(datadir, pages)
+        store.save(path)
+        return store
+
+    def row(self, id):
+        i = self.index[id]
+        return dict((name, column[i]) for name, column in self.columns.items())
+
+    def years(self):
+        return np.array([int(e[:4]) for e in self.columns["end"]], dtype=np.int64)
+
+    def percentile(self, metric, q, mask=None):
+        values = self.columns[metric]
+        if mask is not None:
+            values = values[mask]
+        return np.percentile(values, q)
+
+    def group_by(self, key, metric, func=np.mean):
+        """Apply func to the values of metric for each theme or year, a dossier
+        counting in each of its themes, as an OrderedDict by group."""
+        values = self.columns[metric]
+        if key == "year":
+            groups = self.years()
+        elif key == "theme":
+            themes = [t.split(u",") if t else [] for t in self.columns["themes"]]
+            groups = np.array([t for ts in themes for t in ts], dtype=np.unicode_)
+            values = np.repeat(values, [len(ts) for ts in themes])
+        else:
+            raise ValueError("Unknown group %s, use theme or year" % key)
+        result = OrderedDict()
+        if not len(values):
+            return result
+        order = np.argsort(groups, kind="mergesort")
+        groups, values = groups[order], values[order]
+        names, starts = np.unique(groups, return_index=True)
+        for name, part in zip(names, np.split(values, starts[1:])):
+            result[name] = func(part)
+        return result
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    metric = "total_amendements"
+    group = "year"
+    for opt in sys.argv[1:]:
+        if opt.startswith('--percentile='):
+            metric = opt.split('=', 1)[1]
+        elif opt.startswith('--group-by='):
+            group = opt.split('=', 1)[1]
+    if metric not in METRICS or group not in ("theme", "year"):
+        sys.stderr.write("ERROR: usage: python metricstore.py [DATA_DIR] [--percentile=%s] [--group-by=theme|year]\n" % "|".join(METRICS))
+        exit(1)
+    datadir = args[0] if args else "data"
+    store = MetricStore.load_or_build(datadir, os.path.join(datadir, "dossiers_stats.npz"))
+    if not len(store):
+        sys.stderr.write("ERROR: no dossiers pages found in %s\n" % datadir)
+        exit(1)
+    print "%d dossiers" % len(store)
+    for q in (10, 25, 50, 75, 90):
+        print "%s p%d : %f" % (metric, q, store.percentile(metric, q))
+    for name, value in store.group_by(group, metric).items():
+        print (u"%s %s : %f" % (metric, name, value)).encode("utf-8")
@@ -2,9 +2,10 @@
 # -*- coding: utf-8 -*-
 
 import os, sys
+import numpy as np
 from common import *
 sys.path.append(os.path.join("..", "collectdata"))
-from sort_articles import compare_articles
+from sort_articles import article_sort_key
 
 context = Context(sys.argv, load_parls=True)
 procedure = context.get_procedure()
@@ -45,27 +46,61 @@ def find_groupe(amd):
             result = g
     return result
 
-def add_link(links, pA, pB, weight=1):
-    p1 = min(pA, pB)
-    p2 = max(pA, pB)
-    linkid = "%s-%s" % (p1, p2)
-    if linkid not in links:
-        links[linkid] = {
+def build_links(codes, weights, pids):
+    """Sum the weights of the pairs of indexes in pids coded as low << 32 | high
+    into links between parlementaires ids, inserted in the order the pairs
+    first appear in codes as link by link accumulation would."""
+    links = {}
+    if not codes:
+        return links
+    pairs, first, inverse = np.unique(np.array(codes, dtype=np.int64), return_index=True, return_inverse=True)
+    totals = np.bincount(inverse, weights=weights).astype(np.int64)
+    order = np.argsort(first, kind='mergesort')
+    pairs, totals = pairs[order], totals[order]
+    # Links go from the lowest parlementaire id to the highest
+    rank = np.empty(len(pids), dtype=np.int64)
+    rank[sorted(range(len(pids)), key=pids.__getitem__)] = np.arange(len(pids))
+    a, b = pairs >> 32, pairs & 0xffffffff
+    low = np.where(rank[a] <= rank[b], a, b)
+    high = a + b - low
+    for p1, p2, w in zip([pids[i] for i in low.tolist()], [pids[i] for i in high.tolist()], totals.tolist()):
+        links["%s-%s" % (p1, p2)] = {
           "1": p1,
           "2": p2,
-          "w": 0
+          "w": w
         }
-    links[linkid]["w"] += weight
-
+    return links
+
+
+# Fields of the amendements used here, their texts and exposes are left out
+AMENDEMENT_FIELDS = ["id", "sort", "sujet", "numero", "date", "signataires", "groupes_parlementaires",
+                     "parlementaires", "cle_unicite", "ordre_article", "url_nosdeputes", "url_nossenateurs"]
+
+def read_amendements(directory):
+    """Read amendements.json one amendement at a time, keeping only its AMENDEMENT_FIELDS."""
+    amendements = []
+    try:
+        with open(os.path.join(directory, 'amendements.json'), 'r') as f:
+            for amd in iter_json_array(f, 'amendements'):
+                a = amd['amendement']
+                amendements.append({'amendement': dict((k, a[k]) for k in AMENDEMENT_FIELDS if k in a)})
+    except Exception as e:
+        print >> sys.stderr, type(e), e
+        sys.stderr.write("ERROR: Could not open file amendements.json in dir %s\n" % directory.encode('utf-8'))
+        exit(1)
+    return amendements
 
 steps = {}
 for step in procedure['steps']:
     if not 'nb_amendements' in step or not step['nb_amendements']:
         continue
 
-    amendements_src = open_json(os.path.join(context.sourcedir, 'procedure', step['amendement_directory']), 'amendements.json')['amendements']
+    amendements_src = read_amendements(os.path.join(context.sourcedir, 'procedure', step['amendement_directory']))
 
     typeparl, urlapi = identify_room(amendements_src, 'amendement')
+    # Look the authors up all at once rather than one at a time below
+    slugs = [p["parlementaire"] for amd in amendements_src if amd['amendement'].get("sort") != u"Rectifié" for p in amd['amendement'].get("parlementaires", [])]
+    context.prefetch_parlementaires(urlapi, slugs)
 
     sujets = {}
     groupes = {}
@@ -73,7 +108,12 @@ for step in procedure['steps']:
     fix_order = False
     orders = []
     parls = {}
-    links = {}
+    # Cosignatures as coded pairs of indexes of parlementaires with weights,
+    # and for each cle_unicite the signers in order with their counts
+    pids = []
+    pindex = {}
+    codes = []
+    weights = []
     idents = {}
     for amd in amendements_src:
         a = amd['amendement']
@@ -115,7 +155,8 @@ for step in procedure['steps']:
         cosign = []
         hmd5 = a["cle_unicite"]
         if hmd5 not in idents:
-            idents[hmd5] = []
+            idents[hmd5] = ([], {})
+        signers, signatures = idents[hmd5]
         for parll in a["parlementaires"]:
             parl = parll["parlementaire"]
             if parl not in parls:
@@ -130,16 +171,27 @@ for step in procedure['steps']:
                 }
             pid = parls[parl]["i"]
             parls[parl]["a"] += 1
-            for cid in cosign:
-                add_link(links, pid, cid)
-                #add_link(links, pid, cid, 2)
-            cosign.append(pid)
-            for cid in idents[hmd5]:
-                add_link(links, pid, cid)
-            idents[hmd5].append(pid)
+            if pid not in pindex:
+                pindex[pid] = len(pids)
+                pids.append(pid)
+            i = pindex[pid]
+            for c in cosign:
+                codes.append(c << 32 | i if c < i else i << 32 | c)
+                weights.append(1)
+            cosign.append(i)
+            # One link per former signature of an identical amendment
+            for c in signers:
+                codes.append(c << 32 | i if c < i else i << 32 | c)
+                weights.append(signatures[c])
+            if i not in signatures:
+                signers.append(i)
+                signatures[i] = 0
+            signatures[i] += 1
+
+    del amendements_src
 
     if fix_order:
-        orders.sort(compare_articles)
+        orders.sort(key=article_sort_key)
         for i, k in enumerate(orders):
             sujets[k]["order"] = i
 
@@ -152,7 +204,7 @@ for step in procedure['steps']:
 
     linksfile = os.path.join(context.sourcedir, 'viz', 'amendements_links_%s.json' % step['directory'])
     data = {'id_step': step['directory'],
-            'links': links.values(),
+            'links': build_links(codes, weights, pids).values(),
             'parlementaires': dict((p["i"], dict((k, p[k]) for k in "psang")) for p in parls.values())}
     print_json(data, linksfile)
 
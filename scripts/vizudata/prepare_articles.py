@@ -1,11 +1,26 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+"""Run with python prepare_articles.py PROCEDURE_DIR [--diff-engine=difflib|myers|auto] [--jobs=N]
+see textdiff.py for the engines measuring how much each article changed,
+with --jobs the changed articles are compared over N processes"""
 
 import re, csv, os, sys
-from difflib import ndiff, SequenceMatcher
+from multiprocessing import Pool
 from common import json, open_json, print_json
+from textdiff import ENGINES, diff_type, n_diff, n_diff_job
 
-sourcedir = sys.argv[1]
+args = [a for a in sys.argv[1:] if not a.startswith('--')]
+engine = "difflib"
+jobs = 1
+for opt in sys.argv[1:]:
+    if opt.startswith('--diff-engine='):
+        engine = opt.split('=', 1)[1]
+    elif opt.startswith('--jobs='):
+        jobs = int(opt.split('=', 1)[1])
+if engine not in ENGINES:
+    sys.stderr.write('Error, unknown diff engine %s, use one of %s' % (engine, ", ".join(ENGINES)))
+    exit(1)
+sourcedir = args[0] if args else None
 if not sourcedir:
     sys.stderr.write('Error, no input directory given')
     exit(1)
@@ -78,6 +93,16 @@ bister = '(un|duo|tre|bis|qua|quin[tqu]*|sex|sept|octo?|novo?|non|dec|vic|ter|ie
 re_alin_sup = re.compile(ur'supprimés?\)$', re.I)
 re_clean_alin = re.compile(r'^"?([IVXCDLM]+|\d+|[a-z]|[°)\-\.\s]+)+\s*((%s|[A-Z]+)[°)\-\.\s]+)*' % bister)
 re_upper_first = re.compile(r'^(.)(.*)$')
+
+def clean_text(text):
+    alineas = [re_clean_alin.sub('', v) for v in text if not re_alin_sup.search(v)]
+    return alineas, "\n".join(alineas)
+
+# Steps of the changed articles with the texts to compare, measured at the end
+diffs = []
+# Cleaned alineas and joined text of the articles by step_id then id, only
+# kept for the current step and the previous one the diffs are made against
+cleaned = {}
 step_id = ''
 old_step_id = ''
 for nstep, step in enumerate(steps):
@@ -113,12 +138,10 @@ for nstep, step in enumerate(steps):
                 s = create_step(step_id, step['directory'], article=article)
                 if 'newtitre' in article:
                     s['newnum'] = article['newtitre']
-                txt = "\n".join([re_clean_alin.sub('', v) for v in s['text'] if not re_alin_sup.search(v)])
-                oldtext = None
-                for st in out['articles'][id]['steps']:
-                    if st['id_step'] == old_step_id:
-                        oldtext = [re_clean_alin.sub('', v) for v in st['text'] if not re_alin_sup.search(v)]
-                        break
+                current = clean_text(s['text'])
+                cleaned.setdefault(step_id, {}).setdefault(id, current)
+                txt = current[1]
+                oldtext, oldtxt = cleaned.get(old_step_id, {}).get(id, (None, None))
                 if txt and (not oldtext or nstep < depots):
                     s['status'] = 'new' if nstep >= depots else 'none'
                     s['diff'] = 'add'
@@ -127,29 +150,13 @@ for nstep, step in enumerate(steps):
                     s['diff'] = 'rem'
                     s['n_diff'] = 0
                 else:
-                    oldtxt = "\n".join(oldtext)
                     s['status'] = 'none'
                     if txt == oldtxt:
                         s['diff'] = 'none'
                         s['n_diff'] = 0
                     else:
-                        compare = list(ndiff(s['text'], oldtext))
-                        mods = {'+': 0, '-': 0}
-                        for line in compare:
-                            mod = line[0]
-                            if mod not in mods:
-                                mods[mod] = 0
-                            mods[mod] += 1
-                        if mods['+'] > mods['-']:
-                            s['diff'] = 'add'
-                        elif mods['+'] < mods['-']:
-                            s['diff'] = 'rem'
-                        elif mods['+'] * mods['-']:
-                            s['diff'] = 'both'
-                        else:
-                            s['diff'] = 'none'
-                        a = SequenceMatcher(None, oldtxt, txt).get_matching_blocks()
-                        s['n_diff'] = 1 - float(sum([m[2] for m in a])) / max(a[-1][0], a[-1][1])
+                        s['diff'] = diff_type(s['text'], oldtext)
+                        diffs.append((s, oldtxt, txt))
             else:
                 out['articles'][id] = {}
                 out['articles'][id]['id'] = id
@@ -160,6 +167,7 @@ for nstep, step in enumerate(steps):
                     out['articles'][id]['section'] = 'A%s' % article['titre']
                 out['articles'][id]['steps'] = []
                 s = create_step(step_id, step['directory'], article)
+                cleaned.setdefault(step_id, {}).setdefault(id, clean_text(s['text']))
                 s['n_diff'] = 1
                 s['diff'] = 'add'
                 if nstep >= depots:
@@ -175,11 +183,25 @@ for nstep, step in enumerate(steps):
             out['articles'][id]['steps'].append(s)
         if 'step' in step and not echec:
             old_step_id = step_id
+            cleaned = {step_id: cleaned.get(step_id, {})}
 
     except Exception as e:
         sys.stderr.write("ERROR parsing step %s:\n%s: %s\n" % (step, type(e), e))
         exit(1)
 
+# Each comparison only depends on its two texts, so they can be shared out
+# between processes and the results set back in the same order
+texts = [(oldtxt, txt, engine) for _, oldtxt, txt in diffs]
+if jobs > 1 and len(texts) > 1:
+    pool = Pool(jobs)
+    results = pool.map(n_diff_job, texts, len(texts) // (jobs * 4) + 1)
+    pool.close()
+    pool.join()
+else:
+    results = [n_diff(*t) for t in texts]
+for (s, _, _), result in zip(diffs, results):
+    s['n_diff'] = result
+
 for a in out['articles']:
     new_steps = []
     for s in out['articles'][a]['steps']:
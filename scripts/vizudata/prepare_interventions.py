@@ -42,7 +42,11 @@ def add_intervs(dic, key, inter):
     dic[key]['nb_mots'] += int(inter['nbmots'])
 
 re_hash = re.compile(r'\W+')
-hash_name = lambda x: re_hash.sub('', x).lower()
+hashes = {}
+def hash_name(x):
+    if x not in hashes:
+        hashes[x] = re_hash.sub('', x).lower()
+    return hashes[x]
 def save_hash(i, dico, val=None):
     if not val:
         val = i['intervenant_fonction']
@@ -71,8 +75,78 @@ def get_o_g(i):
 re_gouv = re.compile(u'(ministre|garde.*sceaux|secr[eéÉ]taire.*[eéÉ]tat|haut-commissaire)', re.I)
 re_parl = re.compile(u'(d[eéÉ]put[eéÉ]|s[eéÉ]nateur|membre du parlement|parlementaire)', re.I)
 re_rapporteur = re.compile(ur'((vice|co|pr[eéÉ]sidente?)[,\-\s]*)?rapporte', re.I)
+speakers = {}
+def classify_speaker(nom, fonction):
+    """Return the html decoded fonction of a speaker and the group it implies
+    or None, once per (nom, fonction) as speakers come back all along a debate."""
+    key = (nom, fonction)
+    if key not in speakers:
+        fonction = decode_html(fonction)
+        role = None
+        if fonction.lower() in [u"président", u"présidente"]:
+            role = u"Présidence"
+        elif re_rapporteur.match(fonction):
+            role = "Rapporteurs"
+        elif re_gouv.search(fonction):
+            role = "Gouvernement"
+        elif re_parl.search(fonction+' '+nom):
+            role = "Autres parlementaires"
+        speakers[key] = (fonction, role)
+    return speakers[key]
+
 steps = {}
 
+# Fields of the interventions used here, their contenu is never kept
+INTERVENTION_FIELDS = ("id", "date", "section", "soussection", "seance_titre", "seance_lieu", "source",
+                       "intervenant_nom", "intervenant_fonction", "intervenant_groupe", "intervenant_slug",
+                       "nbmots", "lois", "url_nosdeputes", "url_nossenateurs")
+
+class Intervention(object):
+    """Compact record of an intervention, read and written as a dict of its
+    INTERVENTION_FIELDS, the lois being the frozenset of the tagged lois ids."""
+    __slots__ = INTERVENTION_FIELDS
+
+    def __init__(self, fields):
+        for k, v in fields:
+            setattr(self, k, v)
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return hasattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+def drop_contenu(pairs):
+    obj = dict(pairs)
+    obj.pop('contenu', None)
+    return obj
+seance_decoder = json.JSONDecoder(object_pairs_hook=drop_contenu)
+
+def read_seance(directory, filename, values):
+    """Yield one at a time the interventions of a seance file as Intervention
+    records, dropping their contenu while parsing. The values are shared through
+    the values dict as the same speakers, sections and dates come back all
+    along a debate."""
+    try:
+        with open(os.path.join(directory, filename), 'r') as f:
+            for inter in iter_json_array(f, 'seance', seance_decoder):
+                i = inter['intervention']
+                i['lois'] = frozenset(l['loi'] for l in i['lois'])
+                yield Intervention((k, values.setdefault(i[k], i[k])) for k in INTERVENTION_FIELDS if k in i)
+    except Exception as e:
+        print >> sys.stderr, type(e), e
+        sys.stderr.write("ERROR: Could not open file %s in dir %s" % (filename, directory.encode('utf-8')))
+        exit(1)
+
 re_id_laststep = re.compile(r'/[^/\d]*(\d+)\D[^/]*$')
 id_step = None
 
@@ -85,93 +159,94 @@ for step in procedure['steps']:
         id_step = None
     if not ('has_interventions' in step and step['has_interventions']):
         continue
+    # Read the seances and, one intervention at a time, init its section and
+    # seance then classify its speaker, keeping it for the final aggregation
+    # which needs the groups of all the speakers
     intervs = []
+    values = {}
+    sections = {}
+    seances = {}
+    sec_order = se_order = 1
+    groupes = {}
+    orateurs = {}
+    orat_gpes = {}
     step['intervention_files'].sort()
     warndone = []
     for interv_file in step['intervention_files']:
-        seance = open_json(os.path.join(context.sourcedir, 'procedure', step['intervention_directory']), "%s.json" % interv_file)['seance']
+        seance = list(read_seance(os.path.join(context.sourcedir, 'procedure', step['intervention_directory']), "%s.json" % interv_file, values))
         has_tag_loi = False
         if id_laststep:
             for i in seance:
-                if {"loi": id_laststep} in i['intervention']['lois']:
+                if id_laststep in i['lois']:
                     has_tag_loi = True
                     break
         for i in seance:
-            del(i['intervention']['contenu'])
-            if has_tag_loi and {"loi": id_laststep} not in i['intervention']['lois']:
+            if has_tag_loi and id_laststep not in i['lois']:
                 if context.DEBUG:
-                    print >> sys.stderr, "SKIPPING interv " + i['intervention']['id'] + " with missing tag loi"
+                    print >> sys.stderr, "SKIPPING interv " + i['id'] + " with missing tag loi"
                 continue
+            if not intervs:
+                typeparl, urlapi = identify_room([{'intervention': i}], 'intervention')
             intervs.append(i)
 
-    typeparl, urlapi = identify_room(intervs, 'intervention')
+            # By default divide in subsections, or by seance if no subsection, counting both until known
+            i['intervenant_fonction'] = i.get('intervenant_fonction', '') or ''
+            se_order = init_section(seances, 'seance_titre', i, se_order)
+            sec_order = init_section(sections, 'soussection', i, sec_order)
+
+            if not i['intervenant_nom']:
+                continue
+            for dic, key in ((seances, 'seance_titre'), (sections, 'soussection')):
+                dic[i[key]]['total_intervs'] += 1
+                dic[i[key]]['total_mots'] += int(i['nbmots'])
+
+            # Consider as separate groups cases such as: personnalités, présidents and rapporteurs
+            gpe = i['intervenant_groupe']
+            i['intervenant_fonction'], role = classify_speaker(i['intervenant_nom'], i['intervenant_fonction'])
+            if role == u"Présidence":
+                gpe = role
+            elif role == "Rapporteurs":
+                gpe = role
+                save_rap(i)
+            elif role == "Gouvernement":
+                gpe = role
+                save_gm(i)
+            elif not gpe and role == "Autres parlementaires":
+                # unmeaningful information hard to rematch to the groups, usually invectives, skipping it
+                if context.DEBUG and i['intervenant_nom'] not in warndone:
+                    warndone.append(i['intervenant_nom'])
+                    print >> sys.stderr, 'WARNING: skipping interventions from %s at %s\n' % (i['intervenant_nom'], i['url_nos%ss' % typeparl])
+                continue
+            if not gpe:
+                if context.DEBUG and i['intervenant_nom'] not in warndone:
+                    warndone.append(i['intervenant_nom'])
+                    print >> sys.stderr, 'WARNING: neither groupe nor function found for %s at %s\n' % (i['intervenant_nom'], i['url_nos%ss' % typeparl])
+                gm = get_gm(i)
+                if gm:
+                    gpe = "Gouvernement"
+                    i['intervenant_fonction'] = gm
+                else:
+                    gpe = u"Auditionnés"
+            else:
+                ra = get_rap(i)
+                if ra:
+                    gpe = "Rapporteurs"
+                    i['intervenant_fonction'] = ra
+            existing = get_o_g(i)
+            if not (existing and gpe == u"Présidence") and gpe != existing:
+                save_o_g(i, gpe)
+    del values
 
-    # By default divide in subsections, or by seance if no subsection
-    sections = {}
-    seances = {}
-    sec_order = se_order = 1
-    for i in intervs:
-        i['intervention']['intervenant_fonction'] = i['intervention'].get('intervenant_fonction', '') or ''
-        se_order = init_section(seances, 'seance_titre', i['intervention'], se_order)
-        sec_order = init_section(sections, 'soussection', i['intervention'], sec_order)
     sectype = 'soussection'
     if len(sections) < 2:
         sectype = 'seance_titre'
         sections = seances
 
-    groupes = {}
-    orateurs = {}
-    orat_gpes = {}
-    for inter in intervs:
-        i = inter['intervention']
-        if not i['intervenant_nom']:
-            continue
-        sections[i[sectype]]['total_intervs'] += 1
-        sections[i[sectype]]['total_mots'] += int(i['nbmots'])
-
-        # Consider as separate groups cases such as: personnalités, présidents and rapporteurs
-        gpe = i['intervenant_groupe']
-        i['intervenant_fonction'] = decode_html(i['intervenant_fonction'])
-        if i['intervenant_fonction'].lower() in [u"président", u"présidente"]:
-            gpe = u"Présidence"
-        elif re_rapporteur.match(i['intervenant_fonction']):
-            gpe = "Rapporteurs"
-            save_rap(i)
-        elif re_gouv.search(i['intervenant_fonction']):
-            gpe = "Gouvernement"
-            save_gm(i)
-        elif not gpe and re_parl.search(i['intervenant_fonction']+' '+i['intervenant_nom']):
-            gpe = "Autres parlementaires"
-            # unmeaningful information hard to rematch to the groups, usually invectives, skipping it
-            if context.DEBUG and i['intervenant_nom'] not in warndone:
-                warndone.append(i['intervenant_nom'])
-                print >> sys.stderr, 'WARNING: skipping interventions from %s at %s\n' % (i['intervenant_nom'], i['url_nos%ss' % typeparl])
-            continue
-        if not gpe:
-            if context.DEBUG and i['intervenant_nom'] not in warndone:
-                warndone.append(i['intervenant_nom'])
-                print >> sys.stderr, 'WARNING: neither groupe nor function found for %s at %s\n' % (i['intervenant_nom'], i['url_nos%ss' % typeparl])
-            gm = get_gm(i)
-            if gm:
-                gpe = "Gouvernement"
-                i['intervenant_fonction'] = gm
-            else:
-                gpe = u"Auditionnés"
-        else:
-            ra = get_rap(i)
-            if ra:
-                gpe = "Rapporteurs"
-                i['intervenant_fonction'] = ra
-        existing = get_o_g(i)
-        if not (existing and gpe == u"Présidence") and gpe != get_o_g(i):
-            save_o_g(i, gpe)
-
-    for inter in intervs:
-        i = inter['intervention']
+    for i in intervs:
         gpe = get_o_g(i)
         if not gpe:
             continue
-        gpid = context.add_groupe(groupes, get_o_g(i), urlapi)
+        gpid = context.add_groupe(groupes, gpe, urlapi)
         add_intervs(sections[i[sectype]]['groupes'], gpid, i)
 
         # Consider as two separate speakers a same perso with two different fonctions
@@ -181,8 +256,8 @@ for step in procedure['steps']:
                                  'fonction': i['intervenant_fonction'],
                                  'groupe': i['intervenant_groupe'],
                                  'color': '#888888',
-                                 'link': parl_link(i, urlapi),
-                                 'photo': photo_link(i, urlapi)}
+                                 'link': parl_link(i.get('intervenant_slug', ''), urlapi),
+                                 'photo': photo_link(i.get('intervenant_slug', ''), urlapi)}
             if i['intervenant_groupe'] and i['intervenant_groupe'].upper() in context.allgroupes[urlapi]:
                 orateurs[orateur]['color'] = context.allgroupes[urlapi][i['intervenant_groupe'].upper()]['color']
         else: